@@ -0,0 +1,171 @@
+"""Микробенчмарки накладных расходов декоратора strict
+
+Для функций арности 0-16 замеряется вызов через strict и без него:
+позиционные и именованные аргументы, корректные типы и нарушение,
+первый вызов свежей обёртки (cold) и повторные вызовы (warm).
+Результаты выводятся в JSON в нс/вызов и сравниваются с сохранённым
+базовым уровнем. Базовый уровень зависит от машины: перед сравнением
+его стоит снять на той же машине через --update-baseline.
+
+Запуск:
+    python bench.py                      # сравнить с bench_baseline.json
+    python bench.py --update-baseline    # перезаписать базовый уровень
+    python bench.py --output result.json --threshold 0.3
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+
+from solution import strict
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+MAX_ARITY = 16
+# Относительный порог регрессии и абсолютный допуск на шум, нс
+DEFAULT_THRESHOLD = 0.25
+NOISE_NS = 50
+
+
+def make_function(arity):
+    """Создаёт функцию с arity параметрами типа int"""
+    params = ', '.join(f'a{i}: int' for i in range(arity))
+    namespace = {}
+    exec(f'def f({params}) -> None:\n    return None\n', namespace)
+    return namespace['f']
+
+
+def make_call(func, arity, style, valid):
+    """Возвращает вызов без аргументов с заранее собранными args/kwargs"""
+    values = list(range(arity))
+    if not valid:
+        values[-1] = str(values[-1])
+
+    if style == 'keyword':
+        kwargs = {f'a{i}': value for i, value in enumerate(values)}
+        call = lambda: func(**kwargs)
+    else:
+        args = tuple(values)
+        call = lambda: func(*args)
+
+    if valid:
+        return call
+
+    def violating():
+        try:
+            call()
+        except TypeError:
+            pass
+
+    return violating
+
+
+def time_warm(call, number, repeat):
+    """Минимальное время одного вызова, нс"""
+    timings = timeit.Timer(call).repeat(repeat=repeat, number=number)
+    return min(timings) / number * 1e9
+
+
+def time_cold(arity, style, samples):
+    """Медиана времени декорирования и первого вызова свежей обёртки, нс"""
+    timings = []
+    for _ in range(samples):
+        fresh = make_function(arity)
+        start = time.perf_counter_ns()
+        make_call(strict(fresh), arity, style, True)()
+        timings.append(time.perf_counter_ns() - start)
+    return statistics.median(timings)
+
+
+def run(number=10000, repeat=5, cold_samples=200):
+    """Прогоняет все сценарии и возвращает словарь результатов"""
+    results = {}
+    for arity in range(MAX_ARITY + 1):
+        plain = make_function(arity)
+        decorated = strict(make_function(arity))
+
+        for style in ('positional', 'keyword'):
+            if arity == 0 and style == 'keyword':
+                continue
+
+            raw_ns = time_warm(make_call(plain, arity, style, True), number, repeat)
+            paths = [True] if arity == 0 else [True, False]
+            for valid in paths:
+                path = 'pass' if valid else 'violation'
+                call = make_call(decorated, arity, style, valid)
+                strict_ns = time_warm(call, number, repeat)
+                results[f'arity={arity}/{style}/{path}/warm'] = {
+                    'ns_per_call': round(strict_ns, 1),
+                    'undecorated_ns_per_call': round(raw_ns, 1),
+                    'overhead_ns': round(strict_ns - raw_ns, 1),
+                }
+
+            cold_ns = time_cold(arity, style, cold_samples)
+            results[f'arity={arity}/{style}/pass/cold'] = {
+                'ns_per_call': round(cold_ns, 1),
+                'undecorated_ns_per_call': round(raw_ns, 1),
+                'overhead_ns': round(cold_ns - raw_ns, 1),
+            }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Список сценариев, где накладные расходы выросли сверх порога"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        limit = previous['overhead_ns'] * (1 + threshold) + NOISE_NS
+        if result['overhead_ns'] > limit:
+            regressions.append({
+                'case': name,
+                'overhead_ns': result['overhead_ns'],
+                'baseline_overhead_ns': previous['overhead_ns'],
+            })
+    return regressions
+
+
+def main(argv=None):
+    """Точка входа командной строки"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--output', help='файл для JSON-результатов (по умолчанию stdout)')
+    parser.add_argument('--number', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = run(number=args.number, repeat=args.repeat)
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+            file.write('\n')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        report['threshold'] = args.threshold
+        report['regressions'] = compare(results, baseline, args.threshold)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
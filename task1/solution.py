@@ -1,29 +1,1175 @@
+import array
+import collections.abc
+import functools
 import inspect
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import types
+import typing
+import weakref
+from collections import Counter, OrderedDict, namedtuple
 
 
-def strict(func):    
-    """Декоратор для строгой проверки типов аргументов"""
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+# Режимы проверки
+ALWAYS = 'always'
+OFF = 'off'
+Sample = namedtuple('Sample', ['rate'])
+FirstN = namedtuple('FirstN', ['n'])
+
+
+def sample(rate):
+    """Режим выборочной проверки
+
+    Целое rate >= 1 - проверяется каждый rate-й вызов (начиная с первого),
+    дробное 0 < rate < 1 - случайная доля вызовов.
+    """
+    if isinstance(rate, bool) or not isinstance(rate, (int, float)) or rate <= 0:
+        raise ValueError(f"Sample rate must be positive, not {rate!r}")
+    if isinstance(rate, float) and rate >= 1:
+        if not rate.is_integer():
+            raise ValueError(f"Sample rate must be an integer or below 1, not {rate!r}")
+        rate = int(rate)
+    return Sample(rate)
+
+
+def first_n(n):
+    """Режим проверки только первых n вызовов каждой функции"""
+    if isinstance(n, bool) or not isinstance(n, int) or n < 0:
+        raise ValueError(f"First-n count must be a non-negative integer, not {n!r}")
+    return FirstN(n)
+
+
+# Стратегии глубокой проверки элементов коллекций
+FULL = 'full'
+FirstK = namedtuple('FirstK', ['k'])
+RandomK = namedtuple('RandomK', ['k'])
+
+
+def first_k(k):
+    """Проверять только первые k элементов коллекции"""
+    if isinstance(k, bool) or not isinstance(k, int) or k < 0:
+        raise ValueError(f"Element count must be a non-negative integer, not {k!r}")
+    return FirstK(k)
+
+
+def random_k(k):
+    """Проверять k случайных элементов коллекции
+
+    Случайная выборка берётся из list и tuple; для множеств и словарей,
+    которые не поддерживают доступ по индексу, проверяются первые k элементов.
+    """
+    if isinstance(k, bool) or not isinstance(k, int) or k < 0:
+        raise ValueError(f"Element count must be a non-negative integer, not {k!r}")
+    return RandomK(k)
+
+
+# По умолчанию стоимость проверки коллекции не зависит от её размера
+DEFAULT_DEEP = FirstK(32)
+
+
+def _parse_mode(mode):
+    """Приводит режим к каноническому виду
+
+    Принимает ALWAYS, OFF, результаты sample()/first_n() и строки вида
+    'always', 'off', 'sample:0.01', 'sample:100', 'first_n:1000'.
+    """
+    if isinstance(mode, (Sample, FirstN)) or mode in (ALWAYS, OFF):
+        return mode
+
+    if isinstance(mode, str):
+        name, _, value = mode.strip().lower().partition(':')
+        try:
+            if name == 'sample':
+                return sample(float(value) if '.' in value else int(value))
+            if name == 'first_n':
+                return first_n(int(value))
+        except ValueError:
+            pass
+
+    raise ValueError(f"Unknown strict mode: {mode!r}")
+
+
+# Режим по умолчанию читается из окружения один раз при импорте
+_default_mode = _parse_mode(os.environ.get('STRICT_MODE', ALWAYS))
+# Инструментирование по умолчанию выключено и не добавляет накладных расходов
+_instrumentation_enabled = False
+# Обёртка -> функция перепривязки под текущие настройки по умолчанию
+_refreshers = weakref.WeakKeyDictionary()
+
+
+def _refresh_all():
+    """Перепривязывает реализации всех обёрток под настройки по умолчанию"""
+    for refresh in list(_refreshers.values()):
+        refresh()
+
+
+def get_mode():
+    """Возвращает режим проверки по умолчанию"""
+    return _default_mode
+
+
+def set_mode(mode):
+    """Меняет режим по умолчанию и перепривязывает следующие ему обёртки
+
+    Функции, задекорированные в режиме OFF, остаются исходными объектами
+    и этим переключением не затрагиваются.
+    """
+    global _default_mode
+    _default_mode = _parse_mode(mode)
+    _refresh_all()
+
+
+def _mode_impl(mode, func, checked, rebind):
+    """Строит реализацию вызова для заданного режима
+
+    Ветвление по режиму происходит здесь, один раз, а не в каждом вызове.
+    """
+    if mode == ALWAYS:
+        return checked
+    if mode == OFF:
+        return func
+
+    if isinstance(mode, Sample):
+        if isinstance(mode.rate, int):
+            counter = itertools.count()
+            every = mode.rate
+
+            def sampled(*args, **kwargs):
+                if next(counter) % every:
+                    return func(*args, **kwargs)
+                return checked(*args, **kwargs)
+        else:
+            rate = mode.rate
+
+            def sampled(*args, **kwargs):
+                if random.random() >= rate:
+                    return func(*args, **kwargs)
+                return checked(*args, **kwargs)
+
+        return sampled
+
+    remaining = mode.n
+    if remaining == 0:
+        return func
+
+    def first(*args, **kwargs):
+        nonlocal remaining
+        remaining -= 1
+        if remaining <= 0:
+            # Последний проверяемый вызов: дальше вызываем функцию напрямую
+            rebind(func)
+        return checked(*args, **kwargs)
+
+    return first
+
+
+# Типы элементов для однородных колонок array.array и NumPy
+_ARRAY_TYPECODES = {
+    **dict.fromkeys('bBhHiIlLqQ', int),
+    **dict.fromkeys('fd', float),
+    **dict.fromkeys('uw', str),
+}
+_DTYPE_KINDS = {'b': bool, 'i': int, 'u': int, 'f': float, 'U': str}
+
+
+def _type_error(param_name, expected_type, actual_type):
+    """Ошибка несоответствия типа аргумента"""
+    error = TypeError(
+        f"Argument '{param_name}' must be "
+        f"{_annotation_name(expected_type)}, "
+        f"not {actual_type.__name__}"
+    )
+    error.param_name = param_name
+    return error
+
+
+def _column_values(column):
+    """Возвращает значения колонки и общий тип элементов, если он известен
+
+    Для array.array и массивов NumPy тип определяется по typecode/dtype за
+    O(1); элементы NumPy переводятся в обычные объекты Python через tolist(),
+    чтобы функция получала те же типы, что и при обычном вызове.
+    """
+    if isinstance(column, array.array):
+        return column, _ARRAY_TYPECODES.get(column.typecode)
+
+    dtype = getattr(column, 'dtype', None)
+    if dtype is not None and hasattr(column, 'tolist'):
+        values = column.tolist()
+        if getattr(column, 'ndim', 1) == 1:
+            return values, _DTYPE_KINDS.get(dtype.kind)
+        return values, None
+
+    return column, None
+
+
+def _column_lists(columns):
+    """Значения колонок одинаковой длины для поэлементного вызова без проверки по колонкам"""
+    columns = [_column_values(column)[0] for column in columns]
+    if len(set(map(len, columns))) > 1:
+        raise ValueError("All columns must have the same length")
+    return columns
+
+
+class _Timing:
+    """Суммарное время и выборка замеров для перцентилей
+
+    Выборка ограничена размером reservoir_size (reservoir sampling), так
+    что память не растёт с числом вызовов.
+    """
+
+    reservoir_size = 1024
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.samples = []
+
+    def add(self, elapsed_ns):
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if len(self.samples) < self.reservoir_size:
+            self.samples.append(elapsed_ns)
+        else:
+            index = random.randrange(self.count)
+            if index < self.reservoir_size:
+                self.samples[index] = elapsed_ns
+
+
+class _ThreadStats:
+    """Счётчики одного потока; пишутся только своим потоком, без блокировок"""
+
+    def __init__(self):
+        self.calls = 0
+        self.validations = 0
+        self.violations = Counter()
+        self.validation = _Timing()
+        self.call = _Timing()
+
+
+def _percentile(samples, fraction):
+    """Перцентиль по методу ближайшего ранга"""
+    if not samples:
+        return 0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class _FunctionStats:
+    """Статистика одной задекорированной функции по всем потокам"""
+
+    def __init__(self, name):
+        self.name = name
+        self.threads = []
+        self._local = threading.local()
+
+    def local(self):
+        """Счётчики текущего потока"""
+        try:
+            return self._local.stats
+        except AttributeError:
+            stats = self._local.stats = _ThreadStats()
+            self.threads.append(stats)
+            return stats
+
+    def instrument(self, func, validate):
+        """Возвращает замеряемые варианты вызова без проверки и с проверкой"""
+        clock = time.perf_counter_ns
+        local = self.local
+
+        def call(*args, **kwargs):
+            stats = local()
+            stats.calls += 1
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.call.add(clock() - start)
+
+        def checked(*args, **kwargs):
+            stats = local()
+            stats.calls += 1
+            stats.validations += 1
+            start = clock()
+            try:
+                validate(args, kwargs)
+            except TypeError as error:
+                stats.violations[getattr(error, 'param_name', '<call>')] += 1
+                raise
+            finally:
+                validated = clock()
+                stats.validation.add(validated - start)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.call.add(clock() - validated)
+
+        return call, checked
+
+    def summary(self):
+        """Сводка по функции в виде словаря"""
+        threads = list(self.threads)
+        violations = Counter()
+        result = {
+            'function': self.name,
+            'calls': sum(stats.calls for stats in threads),
+            'validations': sum(stats.validations for stats in threads),
+        }
+        for stats in threads:
+            violations.update(stats.violations)
+        result['violations'] = dict(violations)
+
+        for stage in ('validation', 'call'):
+            timings = [getattr(stats, stage) for stats in threads]
+            samples = [sample for timing in timings for sample in timing.samples]
+            result[f'{stage}_total_ns'] = sum(timing.total_ns for timing in timings)
+            result[f'{stage}_p50_ns'] = _percentile(samples, 0.50)
+            result[f'{stage}_p95_ns'] = _percentile(samples, 0.95)
+            result[f'{stage}_p99_ns'] = _percentile(samples, 0.99)
+        return result
+
+
+_function_stats = []
+
+
+def enable_instrumentation():
+    """Включает сбор статистики для обёрток без явной настройки instrument"""
+    global _instrumentation_enabled
+    _instrumentation_enabled = True
+    _refresh_all()
+
+
+def disable_instrumentation():
+    """Выключает сбор статистики; обёртки возвращаются к обычным реализациям"""
+    global _instrumentation_enabled
+    _instrumentation_enabled = False
+    _refresh_all()
+
+
+def report(format='table'):
+    """Отчёт о накладных расходах strict по инструментированным функциям
+
+    format='table' - текстовая таблица, format='json' - JSON-массив
+    сводок. Времена указаны в наносекундах.
+    """
+    summaries = [stats.summary() for stats in _function_stats]
+    if format == 'json':
+        return json.dumps(summaries, ensure_ascii=False, indent=2)
+    if format != 'table':
+        raise ValueError(f"Unknown report format: {format!r}")
+
+    header = (
+        f"{'function':<40} {'calls':>10} {'checked':>10} {'violations':>10} "
+        f"{'check_ns':>12} {'check_p50':>10} {'check_p95':>10} "
+        f"{'call_ns':>12} {'call_p50':>10} {'call_p95':>10}"
+    )
+    lines = [header, '-' * len(header)]
+    for summary in summaries:
+        lines.append(
+            f"{summary['function']:<40} {summary['calls']:>10} "
+            f"{summary['validations']:>10} {sum(summary['violations'].values()):>10} "
+            f"{summary['validation_total_ns']:>12} {summary['validation_p50_ns']:>10} "
+            f"{summary['validation_p95_ns']:>10} {summary['call_total_ns']:>12} "
+            f"{summary['call_p50_ns']:>10} {summary['call_p95_ns']:>10}"
+        )
+        for param_name, count in sorted(summary['violations'].items()):
+            lines.append(f"    {param_name}: {count}")
+    return '\n'.join(lines)
+
+
+def reset_report():
+    """Обнуляет накопленную статистику"""
+    for stats in _function_stats:
+        stats.threads.clear()
+        stats._local = threading.local()
+
+
+def _annotation_name(annotation):
+    """Читаемое имя аннотации для сообщений об ошибках"""
+    if isinstance(annotation, type) and typing.get_origin(annotation) is None:
+        return annotation.__name__
+    return repr(annotation).replace('typing.', '')
+
+
+def _plain_type(annotation):
+    """Тип для точной проверки type(value) is T или None для составных аннотаций"""
+    if annotation is None:
+        return type(None)
+    if isinstance(annotation, type) and typing.get_origin(annotation) is None:
+        return annotation
+    return None
+
+
+def _select_items(deep):
+    """Функция, выбирающая элементы коллекции для проверки"""
+    if deep == FULL:
+        return lambda items: items
+
+    k = deep.k
+    if isinstance(deep, FirstK):
+        return lambda items: itertools.islice(items, k)
+
+    def pick(items):
+        n = len(items)
+        if n <= k:
+            return items
+        if not isinstance(items, (list, tuple)):
+            return itertools.islice(items, k)
+        return [items[random.randrange(n)] for _ in range(k)]
+
+    return pick
+
+
+def _all_valid(check):
+    """Проверка всех элементов итерируемого объекта предикатом check"""
+    plain = getattr(check, 'plain', None)
+    if plain is not None:
+        # Для простых типов элементов сравнение идёт на уровне C
+        return lambda items: set(map(type, items)) <= {plain}
+    return lambda items: all(map(check, items))
+
+
+def _compile_check(annotation, deep):
+    """Компилирует аннотацию в предикат value -> bool
+
+    Поддерживаются точные типы, Optional/Union (включая X | Y), list, set,
+    frozenset, tuple (фиксированной длины и tuple[X, ...]) и dict. Объём
+    проверки элементов коллекций задаёт стратегия deep. Предикат строится
+    один раз; для неподдерживаемых аннотаций сразу бросается TypeError.
+    """
+    if annotation is typing.Any:
+        return None
+
+    plain = _plain_type(annotation)
+    if plain is not None:
+        def check(value):
+            return type(value) is plain
+        check.plain = plain
+        return check
+
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Union or origin is types.UnionType:
+        members = [_compile_check(arg, deep) for arg in args]
+        if None in members:
+            return None
+        plain_members = frozenset(m.plain for m in members if hasattr(m, 'plain'))
+        deep_members = tuple(m for m in members if not hasattr(m, 'plain'))
+        return lambda value: (
+            type(value) in plain_members or any(m(value) for m in deep_members)
+        )
+
+    select = _select_items(deep)
+
+    if origin in (list, set, frozenset):
+        if not args:
+            return _compile_check(origin, deep)
+        item_check = _compile_check(args[0], deep)
+        if item_check is None:
+            return _compile_check(origin, deep)
+        items_valid = _all_valid(item_check)
+        return lambda value: type(value) is origin and items_valid(select(value))
+
+    if origin is tuple:
+        if not args:
+            return _compile_check(tuple, deep)
+        if len(args) == 2 and args[1] is Ellipsis:
+            item_check = _compile_check(args[0], deep)
+            if item_check is None:
+                return _compile_check(tuple, deep)
+            items_valid = _all_valid(item_check)
+            return lambda value: type(value) is tuple and items_valid(select(value))
+        if args == ((),):
+            return lambda value: value == ()
+
+        # Кортеж фиксированной длины проверяется полностью
+        item_checks = tuple(
+            _compile_check(arg, deep) or (lambda item: True) for arg in args
+        )
+        return lambda value: (
+            type(value) is tuple
+            and len(value) == len(item_checks)
+            and all(check(item) for check, item in zip(item_checks, value))
+        )
+
+    if origin is dict:
+        if not args:
+            return _compile_check(dict, deep)
+        key_check = _compile_check(args[0], deep) or (lambda key: True)
+        value_check = _compile_check(args[1], deep) or (lambda item: True)
+
+        def check_dict(value):
+            if type(value) is not dict:
+                return False
+            for key, item in select(value.items()):
+                if not key_check(key) or not value_check(item):
+                    return False
+            return True
+
+        return check_dict
+
+    raise TypeError(f"Unsupported annotation for strict: {_annotation_name(annotation)}")
+
+
+def _lenient_check(annotation, deep):
+    """Как _compile_check, но не отвергает неподдерживаемые аннотации
+
+    Для них проверяется isinstance по исходному классу (Callable, Iterable
+    и т. п.), а аннотации без класса (Literal, TypeVar) не проверяются.
+    """
+    try:
+        return _compile_check(annotation, deep)
+    except TypeError:
+        origin = typing.get_origin(annotation) or annotation
+        if isinstance(origin, type):
+            return lambda value: isinstance(value, origin)
+        return None
+
+
+def _compile_signature(signature, checkers):
+    """Строит таблицы проверок по сигнатуре функции
+
+    checkers - словарь имя -> предикат из _compile_check. Для каждого
+    позиционного параметра в кортеж типов попадает тип для точной проверки
+    (None, если аннотации нет или она составная), составные аннотации
+    собираются отдельно в пары (позиция, предикат). Для параметров, которые
+    можно передать по имени, строится словарь имя -> (позиция, тип) и
+    словарь имя -> предикат. Также возвращаются минимальное число позиционных
+    аргументов, общее число обычных параметров и флаг keyword-only параметров.
+    """
+    positional_types = []
+    positional_deep = []
+    keyword_index = {}
+    keyword_deep = {}
+    min_positional = 0
+    n_params = 0
+    has_kwonly = False
+
+    for param in signature.parameters.values():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+
+        check = checkers.get(param.name)
+        expected_type = getattr(check, 'plain', None)
+        is_deep = check is not None and expected_type is None
+
+        if param.kind is param.KEYWORD_ONLY:
+            has_kwonly = True
+        else:
+            if is_deep:
+                positional_deep.append((len(positional_types), check))
+            positional_types.append(expected_type)
+            if param.default is param.empty:
+                min_positional = len(positional_types)
+
+        if param.kind is not param.POSITIONAL_ONLY:
+            keyword_index[param.name] = (n_params, expected_type)
+            if is_deep:
+                keyword_deep[param.name] = check
+        n_params += 1
+
+    return (tuple(positional_types), tuple(positional_deep), keyword_index,
+            keyword_deep, min_positional, n_params, has_kwonly)
+
+
+# Виды функций; определяются один раз при декорировании
+_FUNCTION = 'function'
+_COROUTINE = 'coroutine'
+_GENERATOR = 'generator'
+_ASYNC_GENERATOR = 'async_generator'
+
+_YIELD_ORIGINS = {
+    _GENERATOR: (
+        collections.abc.Generator, collections.abc.Iterator, collections.abc.Iterable,
+    ),
+    _ASYNC_GENERATOR: (
+        collections.abc.AsyncGenerator, collections.abc.AsyncIterator,
+        collections.abc.AsyncIterable,
+    ),
+}
+
+
+def _function_kind(func):
+    """Вид функции: обычная, корутина, генератор или асинхронный генератор"""
+    if inspect.isasyncgenfunction(func):
+        return _ASYNC_GENERATOR
+    if inspect.iscoroutinefunction(func):
+        return _COROUTINE
+    if inspect.isgeneratorfunction(func):
+        return _GENERATOR
+    return _FUNCTION
+
+
+def _result_annotation(annotation, kind):
+    """Аннотация проверяемого результата: возвращаемого или выдаваемого значения"""
+    if kind not in _YIELD_ORIGINS:
+        return annotation
+    if typing.get_origin(annotation) in _YIELD_ORIGINS[kind]:
+        args = typing.get_args(annotation)
+        if args:
+            return args[0]
+    return typing.Any
+
+
+def _result_validator(annotation, kind, deep, compile_check=_compile_check):
+    """Функция, бросающая TypeError для результата неверного типа"""
+    annotation = _result_annotation(annotation, kind)
+    check = compile_check(annotation, deep)
+    if check is None:
+        return None
+
+    what = 'Return value' if kind in (_FUNCTION, _COROUTINE) else 'Yielded value'
+    expected = _annotation_name(annotation)
+
+    def validate_result(value):
+        if not check(value):
+            raise TypeError(f"{what} must be {expected}, not {type(value).__name__}")
+
+    return validate_result
+
+
+async def _checked_coroutine(coroutine, validate_result):
+    """Дожидается корутины и проверяет её результат"""
+    result = await coroutine
+    validate_result(result)
+    return result
+
+
+def _checked_generator(generator, validate_result):
+    """Пропускает значения генератора, проверяя каждое выданное"""
+    try:
+        value = next(generator)
+        while True:
+            try:
+                validate_result(value)
+            except TypeError:
+                generator.close()
+                raise
+            try:
+                sent = yield value
+            except GeneratorExit:
+                generator.close()
+                raise
+            except BaseException as error:
+                value = generator.throw(error)
+            else:
+                value = generator.send(sent)
+    except StopIteration as stop:
+        return stop.value
+
+
+def _async_generator_function(call, validate_result=None):
+    """Асинхронный генератор, пропускающий значения генератора call(...)
+
+    asend(), athrow() и aclose() передаются внутреннему генератору.
+    validate_result, если задан, проверяет каждое выданное значение.
+    """
+    async def forward(*args, **kwargs):
+        generator = call(*args, **kwargs)
+        try:
+            value = await generator.__anext__()
+            while True:
+                if validate_result is not None:
+                    try:
+                        validate_result(value)
+                    except TypeError:
+                        await generator.aclose()
+                        raise
+                try:
+                    sent = yield value
+                except GeneratorExit:
+                    await generator.aclose()
+                    raise
+                except BaseException as error:
+                    value = await generator.athrow(error)
+                else:
+                    value = await generator.asend(sent)
+        except StopAsyncIteration:
+            return
+
+    return forward
+
+
+def _with_results(kind, call, validate_result):
+    """Добавляет к реализации вызова проверку результата"""
+    if validate_result is None:
+        return call
+
+    if kind == _COROUTINE:
+        return lambda *args, **kwargs: _checked_coroutine(call(*args, **kwargs), validate_result)
+    if kind == _GENERATOR:
+        return lambda *args, **kwargs: _checked_generator(call(*args, **kwargs), validate_result)
+    if kind == _ASYNC_GENERATOR:
+        return _async_generator_function(call, validate_result)
+
+    def returning(*args, **kwargs):
+        result = call(*args, **kwargs)
+        validate_result(result)
+        return result
+
+    return returning
+
+
+# Пакетные вызовы обёртки: map по строкам и starmap по колонкам аргументов
+_Batch = namedtuple('_Batch', ['map', 'starmap'])
+
+_Compiled = namedtuple(
+    '_Compiled',
+    ['checked', 'validate', 'validate_result', 'map', 'starmap', 'cache_info', 'cache_clear'],
+)
+
+
+def _compile_function(func, cache_size, deep, kind, check_return, lenient=False):
+    """Разбирает сигнатуру функции и строит её проверки
+
+    Возвращает проверяющий вызов, проверку без вызова, проверку результата
+    (None, если она не нужна), пакетные map/starmap и функции статистики
+    кэша форм вызова. lenient=True строит проверки через _lenient_check.
+    """
+    compile_check = _lenient_check if lenient else _compile_check
     annotations = func.__annotations__
+    if any(isinstance(annotation, str)
+           for name, annotation in annotations.items()
+           if name != 'return' or check_return):
+        # Строковые аннотации (from __future__ import annotations)
+        annotations = typing.get_type_hints(func)
+    validate_result = None
+    if check_return and 'return' in annotations:
+        validate_result = _result_validator(annotations['return'], kind, deep, compile_check)
     signature = inspect.signature(func)
-    
-    def wrapper(*args, **kwargs):
+    checkers = {}
+    for param_name, annotation in annotations.items():
+        if param_name != 'return':
+            check = compile_check(annotation, deep)
+            if check is not None:
+                checkers[param_name] = check
+    (positional_types, positional_deep, keyword_index, keyword_deep,
+     min_positional, n_params, has_kwonly) = _compile_signature(signature, checkers)
+    n_positional = len(positional_types)
+    positional_names = tuple(
+        param.name for param in signature.parameters.values()
+        if param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD)
+    )
+    # Без keyword-only параметров вызов только позиционными аргументами
+    # корректен, если их количество укладывается в диапазон
+    max_positional = n_positional if not has_kwonly else -1
+
+    # Несоответствия типов всегда доходят до полной проверки через bind,
+    # поэтому тексты ошибок одни и те же на любом пути
+    def check_arguments(args, kwargs):
+        """Полная проверка аргументов через signature.bind"""
         bound_args = signature.bind(*args, **kwargs)
         arguments = bound_args.arguments
-        
+
         for param_name, value in arguments.items():
-            if param_name == 'return':
-                continue
-                
-            expected_type = annotations.get(param_name)
-            if expected_type is not None:
-                actual_type = type(value)
-                if actual_type is not expected_type:
-                    raise TypeError(
-                        f"Argument '{param_name}' must be "
-                        f"{expected_type.__name__}, "
-                        f"not {actual_type.__name__}"
-                    )
-        
+            check = checkers.get(param_name)
+            if check is not None and not check(value):
+                raise _type_error(param_name, annotations[param_name], type(value))
+
+    def deep_match(args, kwargs):
+        """Проверка составных аннотаций для вызова известной формы"""
+        n_args = len(args)
+        for index, check in positional_deep:
+            if index < n_args and not check(args[index]):
+                return False
+
+        if keyword_deep:
+            for name, value in kwargs.items():
+                check = keyword_deep.get(name)
+                if check is not None and not check(value):
+                    return False
+
+        return True
+
+    def keywords_match(args, kwargs):
+        """Быстрая проверка вызова, в котором переданы все параметры"""
+        n_args = len(args)
+        if n_args > n_positional or n_args + len(kwargs) != n_params:
+            return False
+
+        for value, expected_type in zip(args, positional_types):
+            if expected_type is not None and type(value) is not expected_type:
+                return False
+
+        for name, value in kwargs.items():
+            entry = keyword_index.get(name)
+            # Неизвестное имя или параметр, уже занятый позиционным аргументом
+            if entry is None or entry[0] < n_args:
+                return False
+            expected_type = entry[1]
+            if expected_type is not None and type(value) is not expected_type:
+                return False
+
+        return deep_match(args, kwargs)
+
+    # Кэш уже проверенных сочетаний типов и имён аргументов для вызовов мимо
+    # позиционного быстрого пути: повторная форма вызова стоит одного поиска
+    # в словаре. Не больше cache_size записей, вытесняется давно не
+    # использованная. Попадание пропускает только проверку типов верхнего
+    # уровня, содержимое коллекций проверяется при каждом вызове
+    known_shapes = OrderedDict()
+    # Вставка и вытеснение идут под блокировкой, попадание - без неё: поиск
+    # и move_to_end по ключу из типов и имён атомарны, а вытесненный другим
+    # потоком ключ даёт KeyError
+    shapes_lock = threading.Lock()
+    # Счётчики попаданий и промахов - [hits, misses] каждого потока,
+    # пишутся только своим потоком и суммируются в cache_info()
+    counters = []
+    local = threading.local()
+
+    def thread_counters():
+        try:
+            return local.counters
+        except AttributeError:
+            thread = local.counters = [0, 0]
+            with shapes_lock:
+                counters.append(thread)
+            return thread
+
+    def validate_shape(args, kwargs):
+        """Проверка формы вызова, не попавшей на позиционный быстрый путь"""
+        if cache_size:
+            key = (
+                tuple(map(type, args)),
+                tuple(kwargs),
+                tuple(map(type, kwargs.values())),
+            )
+            if key in known_shapes and deep_match(args, kwargs):
+                try:
+                    known_shapes.move_to_end(key)
+                except KeyError:
+                    pass
+                thread_counters()[0] += 1
+                return
+            thread_counters()[1] += 1
+
+        if not keywords_match(args, kwargs):
+            check_arguments(args, kwargs)
+
+        if cache_size:
+            with shapes_lock:
+                known_shapes[key] = True
+                if len(known_shapes) > cache_size:
+                    known_shapes.popitem(last=False)
+
+    # Вызов только позиционными аргументами проверяется сравнением
+    # type(arg) is T, без signature.bind и без кэша форм
+    def validate(args, kwargs):
+        """Проверка аргументов без вызова функции"""
+        if not kwargs and min_positional <= len(args) <= max_positional:
+            for value, expected_type in zip(args, positional_types):
+                if expected_type is not None and type(value) is not expected_type:
+                    break
+            else:
+                if not positional_deep or deep_match(args, kwargs):
+                    return
+        validate_shape(args, kwargs)
+
+    def checked(*args, **kwargs):
+        # Повторяет validate() без лишнего вызова на горячем пути
+        if not kwargs and min_positional <= len(args) <= max_positional:
+            for value, expected_type in zip(args, positional_types):
+                if expected_type is not None and type(value) is not expected_type:
+                    break
+            else:
+                if not positional_deep or deep_match(args, kwargs):
+                    return func(*args)
+        validate_shape(args, kwargs)
         return func(*args, **kwargs)
-    
-    return wrapper
\ No newline at end of file
+
+    def cache_info():
+        """Статистика кэша проверенных форм вызова"""
+        with shapes_lock:
+            threads = list(counters)
+            size = len(known_shapes)
+        hits = sum(thread[0] for thread in threads)
+        misses = sum(thread[1] for thread in threads)
+        return CacheInfo(hits, misses, cache_size, size)
+
+    def cache_clear():
+        """Очищает кэш и обнуляет статистику"""
+        with shapes_lock:
+            known_shapes.clear()
+            for thread in counters:
+                thread[0] = thread[1] = 0
+
+    def check_columns(columns):
+        """Проверяет колонки аргументов целиком, по одному проходу на колонку"""
+        checked_columns = []
+        for name, expected_type, column in zip(positional_names, positional_types, columns):
+            values, column_type = _column_values(column)
+            checked_columns.append(values)
+            # В пустой колонке нечего проверять, какой бы ни была её типизация
+            if not len(values):
+                continue
+            if expected_type is None:
+                check = checkers.get(name)
+                if check is not None:
+                    for value in values:
+                        if not check(value):
+                            raise _type_error(name, annotations[name], type(value))
+                continue
+            if column_type is expected_type:
+                continue
+
+            if column_type is None and set(map(type, values)) <= {expected_type}:
+                continue
+            for value in values:
+                if type(value) is not expected_type:
+                    raise _type_error(name, expected_type, type(value))
+            raise _type_error(name, expected_type, column_type)
+        return checked_columns
+
+    def batch_map(rows, call=func):
+        """Вызывает call для каждого кортежа аргументов из rows
+
+        Аргументы проверяются по колонкам до первого вызова. Строки разной
+        длины или неподходящей длины проверяются обычным путём по одной.
+        call - вызов без проверки аргументов (например, с проверкой результата).
+        """
+        rows = [tuple(row) for row in rows]
+        arities = set(map(len, rows))
+        if len(arities) != 1 or not min_positional <= min(arities) <= max_positional:
+            results = []
+            for row in rows:
+                validate(row, {})
+                results.append(call(*row))
+            return results
+
+        check_columns(list(zip(*rows)))
+        return [call(*row) for row in rows]
+
+    def batch_starmap(columns, call=func):
+        """Вызывает call поэлементно по колонкам аргументов
+
+        columns - последовательность колонок, по одной на позиционный
+        параметр: списки, array.array или одномерные массивы NumPy.
+        """
+        columns = list(columns)
+        if not min_positional <= len(columns) <= max_positional:
+            raise TypeError(
+                f"Expected from {min_positional} to {n_positional} columns, "
+                f"got {len(columns)}"
+            )
+        if len(set(map(len, columns))) > 1:
+            raise ValueError("All columns must have the same length")
+
+        return list(map(call, *check_columns(columns)))
+
+    return _Compiled(
+        checked, validate, validate_result, batch_map, batch_starmap, cache_info, cache_clear
+    )
+
+
+def strict(func=None, *, cache_size=128, mode=None, deep=DEFAULT_DEEP, instrument=None,
+           lazy=False, check_return=False, lenient=False):
+    """Декоратор для строгой проверки типов аргументов
+
+    Используется как @strict или @strict(...); применённый к классу,
+    оборачивает его методы (см. apply()).
+
+    cache_size - размер кэша проверенных форм вызова, 0 отключает кэш;
+    mode - режим проверки (ALWAYS, OFF, sample(), first_n()), по умолчанию
+    общий (set_mode()); deep - объём проверки элементов коллекций (FULL,
+    first_k(k), random_k(k)); instrument - сбор статистики для
+    strict.report(), по умолчанию как задано enable_instrumentation();
+    lazy - строить проверки при первом вызове; check_return - проверять
+    возвращаемое (для генераторов - выдаваемое) значение; lenient -
+    проверять неподдерживаемые аннотации isinstance по исходному классу
+    или не проверять вовсе, а не отвергать их.
+
+    У обёртки есть map(rows), starmap(columns), set_mode(), set_instrument(),
+    cache_info() и cache_clear().
+    """
+    options = dict(
+        cache_size=cache_size, mode=mode, deep=deep, instrument=instrument, lazy=lazy,
+        check_return=check_return, lenient=lenient,
+    )
+    if func is None:
+        return lambda func: strict(func, **options)
+    if isinstance(func, type):
+        return _apply_to_class(func, options)
+
+    if mode is not None:
+        mode = _parse_mode(mode)
+    if (_default_mode if mode is None else mode) == OFF:
+        # Пакетный API остаётся доступным, но без проверок
+        func.map = lambda rows: [func(*row) for row in rows]
+        func.starmap = lambda columns: list(map(func, *columns))
+        return func
+
+    if deep != FULL and not isinstance(deep, (FirstK, RandomK)):
+        raise ValueError(f"Unknown deep check strategy: {deep!r}")
+
+    # Вид функции определяется один раз. Результат корутины проверяется
+    # после await, у генераторов - каждое выданное значение (X из
+    # Iterator[X], Generator[X, ...] и т. п.), в том же режиме, что и
+    # аргументы. Статистика времени учитывает только создание объекта
+    # корутины или генератора
+    kind = _function_kind(func)
+    compiled = None
+
+    def compile_checks():
+        """Строит проверки при первом обращении"""
+        nonlocal compiled
+        if compiled is None:
+            compiled = _compile_function(
+                func, cache_size, deep, kind, check_return, lenient
+            )
+        return compiled
+
+    if not lazy:
+        compile_checks()
+
+    def bootstrap(*args, **kwargs):
+        """Первый вызов ленивой обёртки: строит проверки и перепривязывается"""
+        compile_checks()
+        refresh()
+        return impl(*args, **kwargs)
+
+    impl = bootstrap
+
+    # Обёртка того же вида, что и функция: фреймворки отличают обработчики
+    # по inspect.is*function. Аргументы генераторов проверяются при первом
+    # next() или обращении к асинхронному генератору, вместе с началом тела.
+    # Корутинная обёртка там, где есть inspect.markcoroutinefunction
+    # (Python 3.12+), - обычная функция с меткой и проверяет аргументы сразу
+    # при вызове, иначе - async def с проверкой при первом await.
+    if kind == _GENERATOR:
+        def wrapper(*args, **kwargs):
+            return (yield from impl(*args, **kwargs))
+    elif kind == _ASYNC_GENERATOR:
+        wrapper = _async_generator_function(lambda *args, **kwargs: impl(*args, **kwargs))
+    elif kind == _COROUTINE and not hasattr(inspect, 'markcoroutinefunction'):
+        async def wrapper(*args, **kwargs):
+            return await impl(*args, **kwargs)
+    else:
+        def wrapper(*args, **kwargs):
+            return impl(*args, **kwargs)
+
+        if kind == _COROUTINE:
+            inspect.markcoroutinefunction(wrapper)
+
+    wrapper = functools.wraps(func)(wrapper)
+
+    def rebind(new_impl):
+        nonlocal impl
+        impl = new_impl
+
+    stats = None
+
+    batch = None
+
+    def refresh():
+        """Перепривязывает реализацию вызова под текущие настройки"""
+        nonlocal stats, batch
+        if compiled is None:
+            rebind(bootstrap)
+            batch = None
+            return
+
+        effective_mode = _default_mode if mode is None else mode
+        enabled = _instrumentation_enabled if instrument is None else instrument
+        # Выключенная статистика не меняет реализацию вызова
+        if enabled:
+            if stats is None:
+                stats = _FunctionStats(f"{func.__module__}.{func.__qualname__}")
+                _function_stats.append(stats)
+            call, check = stats.instrument(func, compiled.validate)
+        else:
+            call, check = func, compiled.checked
+        check = _with_results(kind, check, compiled.validate_result)
+        rebind(_mode_impl(effective_mode, call, check, rebind))
+
+        if effective_mode == ALWAYS and not enabled:
+            # Проверка по колонкам, затем вызовы с проверкой результата
+            result_call = _with_results(kind, func, compiled.validate_result)
+            batch = _Batch(
+                lambda rows: compiled.map(rows, result_call),
+                lambda columns: compiled.starmap(columns, result_call),
+            )
+        else:
+            # Выборочные режимы, OFF и статистика: каждый вызов идёт через
+            # текущую реализацию, как обычный вызов обёртки
+            batch = _Batch(
+                lambda rows: [impl(*row) for row in rows],
+                lambda columns: list(map(impl, *_column_lists(columns))),
+            )
+
+    def set_mode(new_mode):
+        """Меняет режим проверки функции; None - следовать режиму по умолчанию"""
+        nonlocal mode
+        mode = None if new_mode is None else _parse_mode(new_mode)
+        refresh()
+
+    def set_instrument(enabled):
+        """Включает или выключает статистику функции; None - как по умолчанию"""
+        nonlocal instrument
+        instrument = enabled
+        refresh()
+
+    wrapper.cache_info = lambda: compile_checks().cache_info()
+    wrapper.cache_clear = lambda: compile_checks().cache_clear()
+    wrapper.set_mode = set_mode
+    wrapper.set_instrument = set_instrument
+    def current_batch():
+        """Пакетные вызовы под текущие настройки; строит проверки ленивой обёртки"""
+        if batch is None:
+            compile_checks()
+            refresh()
+        return batch
+
+    wrapper.map = lambda rows: current_batch().map(rows)
+    wrapper.starmap = lambda columns: current_batch().starmap(columns)
+    _refreshers[wrapper] = refresh
+    refresh()
+    return wrapper
+
+
+def _apply_to_class(cls, options):
+    """Оборачивает методы класса лениво, сохраняя staticmethod/classmethod"""
+    options = dict(options, lazy=True, lenient=True)
+    for name, attr in list(vars(cls).items()):
+        if isinstance(attr, (staticmethod, classmethod)):
+            if inspect.isfunction(attr.__func__) and attr.__func__ not in _refreshers:
+                setattr(cls, name, type(attr)(strict(attr.__func__, **options)))
+        elif inspect.isfunction(attr) and attr not in _refreshers:
+            setattr(cls, name, strict(attr, **options))
+    return cls
+
+
+def apply(target, **options):
+    """Применяет strict ко всем функциям модуля или методам класса
+
+    Обёртки ленивые: сигнатуры разбираются при первом вызове каждой
+    функции, поэтому импорт не замедляется. В модуле обрабатываются только
+    определённые в нём функции и классы; ссылки, импортированные из модуля
+    до вызова apply(), остаются исходными функциями. options - те же
+    именованные параметры, что у strict.
+    """
+    if isinstance(target, type):
+        return _apply_to_class(target, options)
+
+    # Проверки строятся при первом вызове, и неподдерживаемая аннотация
+    # не должна превращать рабочую функцию в бросающую TypeError
+    options = dict(options, lazy=True, lenient=True)
+    module_name = target.__name__
+    for name, attr in list(vars(target).items()):
+        if getattr(attr, '__module__', None) != module_name:
+            continue
+        if isinstance(attr, type):
+            _apply_to_class(attr, options)
+        elif inspect.isfunction(attr) and attr not in _refreshers:
+            setattr(target, name, strict(attr, **options))
+    return target
+
+
+strict.report = report
+strict.apply = apply
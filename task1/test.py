@@ -1,5 +1,13 @@
+import asyncio
+import inspect
+import json
+import os
+import types
 import unittest
-from solution import strict
+from unittest.mock import patch
+import solution
+from typing import AsyncIterator, Callable, Iterator, Optional, Union
+from solution import strict, sample, first_n, first_k, random_k, OFF, ALWAYS, FULL
 
 class TestStrictDecorator(unittest.TestCase):
     def test_correct_types(self):
@@ -75,5 +83,629 @@ class TestStrictDecorator(unittest.TestCase):
         self.assertEqual(no_annotations(1, 2), 3)
         self.assertEqual(no_annotations("a", "b"), "ab")
 
+    def test_fast_path_error_messages(self):
+        """Проверка, что быстрый путь сохраняет тексты ошибок"""
+        @strict
+        def triple(a: int, b: str, c: float) -> str:
+            return f"{a}{b}{c}"
+
+        # Первым сообщается параметр, идущий раньше в сигнатуре
+        with self.assertRaises(TypeError) as cm:
+            triple(1, 2, "3")
+        self.assertIn("Argument 'b' must be str, not int", str(cm.exception))
+
+        with self.assertRaises(TypeError) as cm:
+            triple(c="3", b=2, a=1)
+        self.assertIn("Argument 'b' must be str, not int", str(cm.exception))
+
+        self.assertEqual(triple(c=3.0, b="x", a=1), "1x3.0")
+
+    def test_unusual_call_shapes(self):
+        """Проверка форм вызова, которые уходят в signature.bind"""
+        @strict
+        def shaped(a: int, b: str = "b", *rest, c: float = 1.0, **extra) -> str:
+            return f"{a}{b}{rest}{c}{extra}"
+
+        self.assertEqual(shaped(1), "1b()1.0{}")
+        self.assertEqual(shaped(1, "x", 2, 3), "1x(2, 3)1.0{}")
+        self.assertEqual(shaped(1, c=2.0, d=4), "1b()2.0{'d': 4}")
+
+        with self.assertRaises(TypeError) as cm:
+            shaped(1, c=2)
+        self.assertIn("Argument 'c' must be float, not int", str(cm.exception))
+
+        # Ошибки формы вызова по-прежнему сообщает signature.bind
+        with self.assertRaises(TypeError) as cm:
+            shaped(b="x")
+        self.assertIn("missing a required argument: 'a'", str(cm.exception))
+
+        @strict
+        def pair(a: int, b: int) -> int:
+            return a + b
+
+        with self.assertRaises(TypeError) as cm:
+            pair(1, a=2)
+        self.assertIn("multiple values for argument 'a'", str(cm.exception))
+
+    def test_shape_cache(self):
+        """Проверка кэша проверенных форм вызова"""
+        @strict
+        def mixed(a: int, b: str, c: float) -> str:
+            return f"{a}{b}{c}"
+
+        self.assertEqual(mixed(1, b="x", c=1.0), "1x1.0")
+        self.assertEqual(mixed(2, b="y", c=2.0), "2y2.0")
+        self.assertEqual(mixed(3, c=3.0, b="z"), "3z3.0")
+        info = mixed.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 2, 2))
+
+        # Известные имена с другими типами в кэш не попадают
+        with self.assertRaises(TypeError):
+            mixed(1, b="x", c=1)
+        self.assertEqual(mixed.cache_info().currsize, 2)
+
+        mixed.cache_clear()
+        self.assertEqual(mixed.cache_info(), (0, 0, 128, 0))
+
+    def test_shape_cache_eviction(self):
+        """Проверка ограничения размера кэша"""
+        @strict(cache_size=2)
+        def pair(a, b: int) -> str:
+            return f"{a}{b}"
+
+        pair(1, b=1)
+        pair("1", b=1)
+        pair(1, b=1)
+        pair(1.0, b=1)  # вытесняет давно не использованную форму со str
+        self.assertEqual(pair.cache_info().currsize, 2)
+        pair(1, b=1)
+        pair("1", b=1)
+        self.assertEqual(pair.cache_info()[:2], (2, 4))
+
+        @strict(cache_size=0)
+        def single(a: int) -> int:
+            return a
+
+        self.assertEqual(single(a=1), 1)
+        self.assertEqual(single.cache_info().currsize, 0)
+
+    def test_shape_cache_threads(self):
+        """Проверка кэша форм при вытеснении из нескольких потоков"""
+        import sys
+        import threading
+
+        @strict(cache_size=1)
+        def pair(v: float, b: int) -> None:
+            return None
+
+        errors = []
+
+        def run(index):
+            try:
+                for i in range(2000):
+                    if (i + index) % 2:
+                        pair(1.0, b=1)
+                    else:
+                        pair(v=1.0, b=1)
+            except Exception as error:
+                errors.append(error)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(errors, [])
+        info = pair.cache_info()
+        self.assertEqual(info.hits + info.misses, 4 * 2000)
+        self.assertEqual(info.currsize, 1)
+
+    def test_mode_off_returns_original(self):
+        """Проверка, что в режиме off возвращается исходная функция"""
+        def plain(a: int) -> int:
+            return a
+
+        self.assertIs(strict(mode=OFF)(plain), plain)
+        self.assertIs(strict(mode='off')(plain), plain)
+
+    def test_mode_sample(self):
+        """Проверка выборочной проверки каждого N-го вызова"""
+        @strict(mode=sample(3))
+        def ident(a: int) -> int:
+            return a
+
+        with self.assertRaises(TypeError):
+            ident("0")  # первый вызов проверяется
+        self.assertEqual(ident("1"), "1")
+        self.assertEqual(ident("2"), "2")
+        with self.assertRaises(TypeError):
+            ident("3")
+
+        @strict(mode=sample(0.5))
+        def rare(a: int) -> int:
+            return a
+
+        with patch('solution.random.random', return_value=0.7):
+            self.assertEqual(rare("x"), "x")
+        with patch('solution.random.random', return_value=0.2):
+            with self.assertRaises(TypeError):
+                rare("x")
+
+    def test_mode_first_n(self):
+        """Проверка режима first_n"""
+        @strict(mode=first_n(2))
+        def ident(a: int) -> int:
+            return a
+
+        with self.assertRaises(TypeError):
+            ident("a")
+        self.assertEqual(ident(1), 1)
+        self.assertEqual(ident("c"), "c")  # проверки закончились
+
+    def test_set_mode_rebinds(self):
+        """Проверка переключения режима во время работы"""
+        @strict
+        def ident(a: int) -> int:
+            return a
+
+        @strict(mode=ALWAYS)
+        def pinned(a: int) -> int:
+            return a
+
+        previous = solution.get_mode()
+        try:
+            solution.set_mode('off')
+            self.assertEqual(ident("x"), "x")
+            with self.assertRaises(TypeError):
+                pinned("x")
+        finally:
+            solution.set_mode(previous)
+
+        with self.assertRaises(TypeError):
+            ident("x")
+
+        ident.set_mode('sample:2')
+        with self.assertRaises(TypeError):
+            ident("x")
+        self.assertEqual(ident("y"), "y")
+
+        with self.assertRaises(ValueError):
+            ident.set_mode('sometimes')
+
+    def test_batch_map(self):
+        """Проверка пакетного вызова по строкам аргументов"""
+        @strict
+        def sum_two(a: int, b: int) -> int:
+            return a + b
+
+        self.assertEqual(sum_two.map([(1, 2), (3, 4)]), [3, 7])
+        self.assertEqual(sum_two.map([]), [])
+
+        calls = []
+
+        @strict
+        def record(a: int, b: str) -> None:
+            calls.append(a)
+
+        # Ошибка обнаруживается до первого вызова
+        with self.assertRaises(TypeError) as cm:
+            record.map([(1, "a"), (2, "b"), (3, 4)])
+        self.assertIn("Argument 'b' must be str, not int", str(cm.exception))
+        self.assertEqual(calls, [])
+
+        # Строки разной длины проверяются по одной
+        with self.assertRaises(TypeError):
+            record.map([(1, "a"), (2,)])
+
+    def test_batch_starmap(self):
+        """Проверка пакетного вызова по колонкам, включая array.array"""
+        from array import array
+
+        @strict
+        def scale(x: float, k: int) -> float:
+            return x * k
+
+        self.assertEqual(scale.starmap([[1.0, 2.0], [2, 3]]), [2.0, 6.0])
+        self.assertEqual(scale.starmap([array('d', [1.0, 2.0]), array('q', [2, 3])]), [2.0, 6.0])
+
+        with self.assertRaises(TypeError) as cm:
+            scale.starmap([array('q', [1, 2]), [2, 3]])
+        self.assertIn("Argument 'x' must be float, not int", str(cm.exception))
+
+        with self.assertRaises(ValueError):
+            scale.starmap([[1.0, 2.0], [2]])
+
+        # Ноль строк не ошибка, даже если тип колонки не подходит
+        self.assertEqual(scale.starmap([array('q'), array('q')]), [])
+        self.assertEqual(scale.starmap([[], []]), [])
+
+        try:
+            import numpy as np
+        except ImportError:
+            self.skipTest("NumPy не установлен")
+
+        result = scale.starmap([np.array([1.5, 2.5]), np.arange(2, 4)])
+        self.assertEqual(result, [3.0, 7.5])
+        self.assertIs(type(result[0]), float)
+
+        with self.assertRaises(TypeError):
+            scale.starmap([np.arange(2), np.arange(2)])
+
+    def test_batch_follows_settings(self):
+        """Пакетные вызовы проверяют результат и следуют режиму и статистике"""
+        @strict(check_return=True)
+        def shout(text: str) -> str:
+            return text.upper() if text else None
+
+        self.assertEqual(shout.map([("a",), ("b",)]), ["A", "B"])
+        with self.assertRaises(TypeError) as cm:
+            shout.map([("a",), ("",)])
+        self.assertIn("Return value must be str, not NoneType", str(cm.exception))
+        with self.assertRaises(TypeError):
+            shout.starmap([["a", ""]])
+
+        shout.set_mode(OFF)
+        # Без проверок неверный результат и аргумент проходят
+        self.assertEqual(shout.map([("",)]), [None])
+        self.assertEqual(shout.starmap([[b""]]), [None])
+
+        shout.set_mode(None)
+        shout.set_instrument(True)
+        try:
+            self.assertEqual(shout.map([("a",), ("b",)]), ["A", "B"])
+            with self.assertRaises(TypeError):
+                shout.map([(1,)])
+            summaries = json.loads(strict.report(format='json'))
+            summary = next(s for s in summaries if s['function'].endswith('shout'))
+            self.assertEqual(summary['calls'], 3)
+            self.assertEqual(summary['violations'], {'text': 1})
+        finally:
+            shout.set_instrument(None)
+
+    def test_generic_annotations(self):
+        """Проверка составных аннотаций"""
+        @strict
+        def generic(
+            xs: list[int],
+            m: dict[str, float],
+            o: Optional[str],
+            u: Union[int, list[str]],
+            t: tuple[int, str],
+        ) -> None:
+            return None
+
+        generic([1, 2], {"a": 1.0}, None, ["x"], (1, "a"))
+        generic(xs=[], m={}, o="s", u=3, t=(2, "b"))
+
+        bad_calls = [
+            (([1, "2"], {}, None, 1, (1, "a")), "Argument 'xs' must be list[int], not list"),
+            (([1], {"a": 1}, None, 1, (1, "a")), "Argument 'm' must be dict[str, float], not dict"),
+            (([1], {}, 1, 1, (1, "a")), "Argument 'o' must be Optional[str], not int"),
+            (([1], {}, None, [1], (1, "a")), "Argument 'u' must be Union[int, list[str]], not list"),
+            (([1], {}, None, 1, (1,)), "Argument 't' must be tuple[int, str], not tuple"),
+            (((1,), {}, None, 1, (1, "a")), "Argument 'xs' must be list[int], not tuple"),
+        ]
+        for args, message in bad_calls:
+            with self.subTest(message=message):
+                with self.assertRaises(TypeError) as cm:
+                    generic(*args)
+                self.assertIn(message, str(cm.exception))
+
+        # Содержимое коллекций проверяется и при попадании в кэш форм вызова
+        generic([1], {}, None, 1, t=(1, "a"))
+        with self.assertRaises(TypeError):
+            generic([1], {}, None, 1, t=("a", 1))
+        with self.assertRaises(TypeError):
+            generic(["1"], {}, None, 1, t=(1, "a"))
+
+    def test_deep_check_strategies(self):
+        """Проверка стратегий глубокой проверки коллекций"""
+        tail_bad = list(range(1000)) + ["bad"]
+
+        @strict
+        def bounded(xs: list[int]) -> int:
+            return len(xs)
+
+        @strict(deep=first_k(10))
+        def head(xs: list[int]) -> int:
+            return len(xs)
+
+        @strict(deep=FULL)
+        def full(xs: list[int]) -> int:
+            return len(xs)
+
+        @strict(deep=random_k(5))
+        def sampled(xs: list[int]) -> int:
+            return len(xs)
+
+        self.assertEqual(bounded(tail_bad), 1001)
+        self.assertEqual(head(tail_bad), 1001)
+        with self.assertRaises(TypeError):
+            full(tail_bad)
+
+        with patch('solution.random.randrange', return_value=1000):
+            with self.assertRaises(TypeError):
+                sampled(tail_bad)
+        with patch('solution.random.randrange', return_value=0):
+            self.assertEqual(sampled(tail_bad), 1001)
+
+        def unsupported(f: Callable[[int], int]) -> int:
+            return f(1)
+
+        # Неподдерживаемая аннотация обнаруживается при декорировании
+        with self.assertRaises(TypeError):
+            strict(unsupported)
+
+    def test_python_union_syntax(self):
+        """Проверка аннотаций вида X | None"""
+        @strict
+        def maybe(a: int | None, b: set[str] | frozenset[str]) -> None:
+            return None
+
+        maybe(None, {"a"})
+        maybe(1, frozenset())
+        with self.assertRaises(TypeError) as cm:
+            maybe(1.0, set())
+        self.assertIn("Argument 'a' must be int | None, not float", str(cm.exception))
+
+    def test_instrumentation_report(self):
+        """Проверка сбора статистики и отчёта"""
+        @strict(instrument=True)
+        def measured(a: int, b: str) -> str:
+            return b * a
+
+        measured(2, "x")
+        measured(1, b="y")
+        for bad in ((1, 2), ("1", "x")):
+            with self.assertRaises(TypeError):
+                measured(*bad)
+
+        summaries = json.loads(strict.report(format='json'))
+        summary = next(s for s in summaries if s['function'].endswith('measured'))
+        self.assertEqual(summary['calls'], 4)
+        self.assertEqual(summary['validations'], 4)
+        self.assertEqual(summary['violations'], {'a': 1, 'b': 1})
+        self.assertGreater(summary['validation_total_ns'], 0)
+        self.assertIn('measured', strict.report())
+
+        # Выключение возвращает обычную реализацию и не копит статистику
+        measured.set_instrument(False)
+        measured(3, "z")
+        summaries = json.loads(strict.report(format='json'))
+        summary = next(s for s in summaries if s['function'].endswith('measured'))
+        self.assertEqual(summary['calls'], 4)
+
+    def test_instrumentation_default(self):
+        """Проверка глобального включения статистики"""
+        @strict(mode=sample(2))
+        def sampled(a: int) -> int:
+            return a
+
+        solution.enable_instrumentation()
+        try:
+            sampled(1)
+            sampled(2)
+            sampled(3)
+        finally:
+            solution.disable_instrumentation()
+        sampled(4)
+
+        summaries = json.loads(strict.report(format='json'))
+        summary = next(s for s in summaries if s['function'].endswith('sampled'))
+        self.assertEqual((summary['calls'], summary['validations']), (3, 2))
+
+        with self.assertRaises(ValueError):
+            strict.report(format='xml')
+
+    def test_lazy_compilation(self):
+        """Проверка, что ленивая обёртка разбирает сигнатуру при первом вызове"""
+        with patch('solution._compile_function', wraps=solution._compile_function) as compile_mock:
+            @strict(lazy=True)
+            def lazy(a: int) -> int:
+                """Документация"""
+                return a
+
+            self.assertEqual(compile_mock.call_count, 0)
+            self.assertEqual(lazy(1), 1)
+            self.assertEqual(lazy(2), 2)
+            with self.assertRaises(TypeError):
+                lazy("3")
+            self.assertEqual(compile_mock.call_count, 1)
+
+        self.assertEqual(lazy.__name__, 'lazy')
+        self.assertEqual(lazy.__doc__, "Документация")
+        self.assertIsNotNone(lazy.__wrapped__)
+
+    def test_class_decorator(self):
+        """Проверка применения strict к классу"""
+        @strict
+        class Account:
+            def __init__(self, balance: int):
+                self.balance = balance
+
+            def deposit(self, amount: int) -> int:
+                self.balance += amount
+                return self.balance
+
+            @staticmethod
+            def fee(amount: float) -> float:
+                return amount * 0.01
+
+            @classmethod
+            def empty(cls, currency: str) -> 'Account':
+                return cls(0)
+
+        account = Account(10)
+        self.assertEqual(account.deposit(5), 15)
+        self.assertEqual(Account.fee(100.0), 1.0)
+        self.assertEqual(Account.empty("RUB").balance, 0)
+        self.assertEqual(Account.deposit.__name__, 'deposit')
+
+        for call in (lambda: Account("10"), lambda: account.deposit(1.5),
+                     lambda: Account.fee(1), lambda: Account.empty(1)):
+            with self.assertRaises(TypeError):
+                call()
+
+    def test_apply_to_module(self):
+        """Проверка strict.apply для модуля"""
+        module = types.ModuleType('strict_apply_example')
+        exec(
+            "from __future__ import annotations\n"
+            "from os.path import join\n"
+            "def double(a: int) -> int:\n"
+            "    return a * 2\n"
+            "class Box:\n"
+            "    def put(self, item: str) -> str:\n"
+            "        return item\n",
+            module.__dict__,
+        )
+        strict.apply(module)
+
+        self.assertEqual(module.double(2), 4)
+        with self.assertRaises(TypeError):
+            module.double("2")
+        with self.assertRaises(TypeError):
+            module.Box().put(1)
+        # Импортированные функции не оборачиваются
+        self.assertIs(module.join, os.path.join)
+
+    def test_apply_unsupported_annotations(self):
+        """strict.apply не ломает функции с неподдерживаемыми аннотациями"""
+        module = types.ModuleType('strict_apply_unsupported')
+        exec(
+            "import typing\n"
+            "T = typing.TypeVar('T')\n"
+            "def cb(f: typing.Callable[[], int]) -> int:\n"
+            "    return f()\n"
+            "def pick(mode: typing.Literal['a', 'b'], item: T) -> T:\n"
+            "    return item\n"
+            "def total(items: typing.Iterable[int]) -> int:\n"
+            "    return sum(items)\n",
+            module.__dict__,
+        )
+        strict.apply(module)
+
+        self.assertEqual(module.cb(lambda: 1), 1)
+        self.assertEqual(module.pick('a', 2), 2)
+        self.assertEqual(module.total(range(3)), 3)
+        # Исходный класс аннотации всё же проверяется
+        with self.assertRaises(TypeError):
+            module.cb(1)
+        with self.assertRaises(TypeError):
+            module.total(5)
+
+        # Явный @strict по-прежнему отвергает такие аннотации сразу
+        with self.assertRaises(TypeError):
+            strict(module.cb.__wrapped__)
+
+    def test_return_check(self):
+        """Проверка возвращаемого значения по check_return"""
+        @strict(check_return=True)
+        def returns_wrong_type(a: int) -> str:
+            return a
+
+        with self.assertRaises(TypeError) as cm:
+            returns_wrong_type(10)
+        self.assertIn("Return value must be str, not int", str(cm.exception))
+
+        @strict(check_return=True, mode=sample(2))
+        def sampled(a: int) -> str:
+            return a
+
+        with self.assertRaises(TypeError):
+            sampled(1)
+        self.assertEqual(sampled(2), 2)  # проверка результата тоже выборочная
+
+    def test_coroutine(self):
+        """Проверка async def функций"""
+        @strict(check_return=True)
+        async def fetch(a: int) -> int:
+            return a if a >= 0 else "negative"
+
+        self.assertTrue(inspect.iscoroutinefunction(fetch))
+        self.assertEqual(asyncio.run(fetch(1)), 1)
+        if hasattr(inspect, 'markcoroutinefunction'):
+            # Обёртка с меткой проверяет аргументы при вызове, а не при await
+            with self.assertRaises(TypeError):
+                fetch("1")
+        with self.assertRaises(TypeError) as cm:
+            asyncio.run(fetch("1"))
+        self.assertIn("Argument 'a' must be int, not str", str(cm.exception))
+        with self.assertRaises(TypeError) as cm:
+            asyncio.run(fetch(-1))
+        self.assertIn("Return value must be int, not str", str(cm.exception))
+
+    def test_generator(self):
+        """Проверка генераторов и выдаваемых значений"""
+        @strict(check_return=True)
+        def countdown(n: int) -> Iterator[int]:
+            while n > 0:
+                received = yield n
+                n -= received or 1
+            yield "done"
+
+        generator = countdown(5)
+        self.assertEqual(next(generator), 5)
+        self.assertEqual(generator.send(3), 2)
+        self.assertEqual(next(generator), 1)
+        with self.assertRaises(TypeError) as cm:
+            next(generator)
+        self.assertIn("Yielded value must be int, not str", str(cm.exception))
+
+        with self.assertRaises(TypeError):
+            next(countdown(1.5))
+
+    def test_async_generator(self):
+        """Проверка асинхронных генераторов"""
+        @strict(check_return=True)
+        async def ticks(n: int) -> AsyncIterator[int]:
+            for i in range(n):
+                yield i
+            yield None
+
+        async def collect(n):
+            return [value async for value in ticks(n)]
+
+        with self.assertRaises(TypeError):
+            asyncio.run(collect("2"))
+        with self.assertRaises(TypeError) as cm:
+            asyncio.run(collect(2))
+        self.assertIn("Yielded value must be int, not NoneType", str(cm.exception))
+
+        ticks.set_mode(OFF)
+        self.assertEqual(asyncio.run(collect(2)), [0, 1, None])
+
+    def test_wrapper_kind(self):
+        """Обёртка того же вида, что и функция, с учётом настроек проверки"""
+        def plain(a: int) -> int:
+            return a
+
+        async def handler(a: int) -> int:
+            return a
+
+        def produce(a: int) -> Iterator[int]:
+            yield a
+
+        async def stream(a: int) -> AsyncIterator[int]:
+            yield a
+
+        predicates = (
+            inspect.iscoroutinefunction, inspect.isgeneratorfunction,
+            inspect.isasyncgenfunction,
+        )
+        for func in (plain, handler, produce, stream):
+            for options in ({}, {'check_return': True}, {'lazy': True}, {'mode': sample(2)}):
+                wrapper = strict(**options)(func)
+                for predicate in predicates:
+                    with self.subTest(func=func.__name__, options=options,
+                                      predicate=predicate.__name__):
+                        self.assertEqual(predicate(wrapper), predicate(func))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
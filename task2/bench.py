@@ -0,0 +1,116 @@
+"""Бенчмарк разбора HTML-страниц категории
+
+Сравнивает прежний разбор (полное дерево BeautifulSoup, поиск групп
+mw-category-group и ссылки pagefrom по всему документу) с однопроходным
+CategoryPageParser, которому текст подаётся фрагментами, как из потока
+ответа. Для каждой сохранённой страницы из fixtures/ выводится время
+разбора в мс и пик выделенной памяти по tracemalloc в КиБ.
+
+Запуск:
+    python bench.py
+    python bench.py --number 50 --output result.json
+"""
+import argparse
+import codecs
+import glob
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from solution import get_animals_from_current_page, parse_category_page
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+CHUNK_SIZE = 16 * 1024
+
+
+def parse_with_soup(content):
+    """Прежний разбор: дерево документа и поиск по нему"""
+    soup = BeautifulSoup(content, 'html.parser')
+    titles = get_animals_from_current_page(soup)
+    next_href = None
+    nav_div = soup.find('div', {'id': 'mw-pages'})
+    if nav_div:
+        for link in nav_div.find_all('a'):
+            if 'pagefrom=' in link.get('href', ''):
+                next_href = link['href']
+                break
+    return titles, next_href
+
+
+def parse_streaming(content):
+    """Новый разбор: тело декодируется и подаётся в парсер фрагментами, как из потока"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = (
+        decoder.decode(content[i:i + CHUNK_SIZE]) for i in range(0, len(content), CHUNK_SIZE)
+    )
+    return parse_category_page(chunks)
+
+
+PARSERS = {
+    'soup': parse_with_soup,
+    'streaming': parse_streaming,
+}
+
+
+def measure_time(parse, content, number, repeat):
+    """Минимальное время одного разбора, мс"""
+    timings = timeit.Timer(lambda: parse(content)).repeat(repeat=repeat, number=number)
+    return min(timings) / number * 1e3
+
+
+def measure_memory(parse, content):
+    """Пик памяти во время разбора, КиБ"""
+    tracemalloc.start()
+    try:
+        parse(content)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def run(number=20, repeat=5):
+    """Прогоняет оба разбора на всех страницах из fixtures/"""
+    results = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html'))):
+        with open(path, 'rb') as file:
+            content = file.read()
+
+        page = {'size_kib': round(len(content) / 1024, 1)}
+        for name, parse in PARSERS.items():
+            titles, next_href = parse(content)
+            page[name] = {
+                'ms_per_page': round(measure_time(parse, content, number, repeat), 3),
+                'peak_kib': round(measure_memory(parse, content), 1),
+                'titles': len(titles),
+                'next_page': next_href is not None,
+            }
+        page['speedup'] = round(page['soup']['ms_per_page'] / page['streaming']['ms_per_page'], 1)
+        page['memory_ratio'] = round(page['soup']['peak_kib'] / page['streaming']['peak_kib'], 1)
+        results[os.path.basename(path)] = page
+    return results
+
+
+def main(argv=None):
+    """Точка входа командной строки"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='файл для JSON-результатов (по умолчанию stdout)')
+    args = parser.parse_args(argv)
+
+    output = json.dumps(run(args.number, args.repeat), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,109 +1,1497 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
+import argparse
+import codecs
+import contextlib
+import cProfile
 import csv
+import gzip
+import hashlib
+import json
+import math
+import os
+import pstats
+import random
 import re
+import socket
+import sys
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, urlencode, urljoin, urlsplit
 from collections import defaultdict
+from email.utils import parsedate_to_datetime
 import time
 
-def get_animals_from_page(url):
-    """Получает список животных с одной страницы категории"""
+# Википедия требует осмысленный User-Agent для автоматических клиентов
+USER_AGENT = "beasts-counter/1.0 (https://github.com/kudriavtsev-maksim/Tetrica-test-2025)"
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 30
+# Параметр maxlag для API: сервер отказывает, если репликация отстаёт сильнее
+MAXLAG = 5
+# Статусы, при которых сервер просит снизить частоту запросов
+THROTTLE_STATUSES = (429, 503)
+
+class RateLimiter:
+    """Адаптивный token bucket, общий для всех запросов
+
+    Запросы идут со скоростью не выше rate в секунду с допустимым всплеском
+    burst. При ответах 429/503 и отказах по maxlag скорость уменьшается
+    вдвое (не ниже min_rate), а новые запросы приостанавливаются на
+    Retry-After или на экспоненциальную паузу со случайным разбросом jitter.
+    Каждый успешный ответ возвращает скорость на increase ближе к max_rate.
+    """
+
+    def __init__(self, rate=5.0, burst=5, min_rate=0.2, max_rate=None,
+                 increase=0.05, backoff=1.0, max_backoff=60.0, jitter=0.25):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate
+        self.increase = increase
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._consecutive_throttles = 0
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'waits': 0, 'total_wait': 0.0, 'max_wait': 0.0,
+                       'throttled': 0}
+
+    def acquire(self):
+        """Дожидается разрешения на запрос; возвращает время ожидания в секундах
+
+        Жетон резервируется под блокировкой, а ожидание идёт без неё, так
+        что параллельные потоки выстраиваются в очередь с шагом 1/rate.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = max(-self._tokens / self.rate, self._blocked_until - now, 0.0)
+
+            self._stats['requests'] += 1
+            if wait > 0:
+                self._stats['waits'] += 1
+                self._stats['total_wait'] += wait
+                self._stats['max_wait'] = max(self._stats['max_wait'], wait)
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def succeeded(self):
+        """Учитывает успешный ответ: скорость постепенно растёт"""
+        with self._lock:
+            self._consecutive_throttles = 0
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def throttled(self, retry_after=None):
+        """Учитывает отказ сервера: скорость снижается, запросы приостанавливаются"""
+        with self._lock:
+            self._consecutive_throttles += 1
+            self._stats['throttled'] += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+
+            if retry_after is None:
+                retry_after = min(
+                    self.max_backoff, self.backoff * 2 ** (self._consecutive_throttles - 1)
+                )
+            pause = retry_after * (1 + random.uniform(0, self.jitter))
+            self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+            return pause
+
+    def stats(self):
+        """Текущая скорость и статистика ожиданий"""
+        with self._lock:
+            return {'rate': self.rate, **self._stats}
+
+def parse_retry_after(value):
+    """Разбирает заголовок Retry-After (секунды или HTTP-дата) в секунды"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
     try:
-        response = requests.get(url)
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_throttled(response):
+    """Просит ли ответ снизить частоту запросов (429/503 или отказ по maxlag)"""
+    return (
+        response.status_code in THROTTLE_STATUSES
+        or response.headers.get('MediaWiki-API-Error') == 'maxlag'
+    )
+
+# Коды ошибок API, которыми сервер просит подождать: повод повторить запрос
+# позже, а не признак того, что API не годится для обхода
+TEMPORARY_API_ERRORS = ('maxlag', 'ratelimited', 'readonly')
+
+class ApiError(RuntimeError):
+    """Ответ MediaWiki API с полем error; code - код ошибки из ответа"""
+
+    def __init__(self, error):
+        if isinstance(error, dict):
+            self.code = error.get('code')
+            info = error.get('info', error)
+        else:
+            self.code = None
+            info = error
+        super().__init__(f"Ошибка API: {info}")
+
+    @property
+    def temporary(self):
+        """Сервер временно перегружен или отстаёт репликация"""
+        code = self.code or ''
+        return code in TEMPORARY_API_ERRORS or code.startswith('internal_api_error')
+
+CACHE_PATH = "beasts_cache.sqlite"
+
+class HttpCache:
+    """Постоянный кэш ответов в SQLite для условных запросов
+
+    По URL хранятся тело, Content-Type, ETag и Last-Modified. Записи старше
+    ttl секунд (с последней проверки на сервере) не используются. Когда
+    суммарный размер тел превышает max_bytes, вытесняются давно не
+    использованные записи. Одно соединение с базой делится между потоками
+    под блокировкой.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=7 * 24 * 3600, max_bytes=200 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'url TEXT PRIMARY KEY, body BLOB NOT NULL, content_type TEXT, etag TEXT, '
+            'last_modified TEXT, size INTEGER NOT NULL, validated REAL NOT NULL, '
+            'accessed REAL NOT NULL)'
+        )
+        self._db.commit()
+        self._stats = {'lookups': 0, 'hits': 0, 'stored': 0, 'evicted': 0, 'bytes_saved': 0}
+
+    def lookup(self, url):
+        """Запись (body, content_type, etag, last_modified) для URL или None"""
+        with self._lock:
+            self._stats['lookups'] += 1
+            row = self._db.execute(
+                'SELECT body, content_type, etag, last_modified, validated '
+                'FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[4] > self.ttl:
+                self._db.execute('DELETE FROM responses WHERE url = ?', (url,))
+                self._db.commit()
+                return None
+            return row[:4]
+
+    @staticmethod
+    def cacheable(response):
+        """Можно ли проверить ответ условным запросом: есть ETag или Last-Modified"""
+        return bool(response.headers.get('ETag') or response.headers.get('Last-Modified'))
+
+    def store(self, url, response, body=None):
+        """Сохраняет ответ 200, если у него есть ETag или Last-Modified
+
+        body - уже прочитанное тело; по умолчанию берётся response.content.
+        """
+        if not self.cacheable(response):
+            return
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if body is None:
+            body = response.content
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, body, response.headers.get('Content-Type'), etag, last_modified,
+                 len(body), now, now),
+            )
+            self._stats['stored'] += 1
+            self._evict()
+            self._db.commit()
+
+    def store_when_read(self, url, response):
+        """Сохраняет потоковый ответ 200, когда его тело прочитано до конца
+
+        Тело копируется по мере чтения через iter_content (через него же
+        читает и response.content), поэтому разбор идёт по потоку, а запись
+        в кэш происходит после последнего фрагмента. Недочитанное тело не
+        сохраняется.
+        """
+        if not self.cacheable(response):
+            return
+        iter_content = response.iter_content
+
+        def teeing(chunk_size=1, decode_unicode=False):
+            body = bytearray()
+
+            def tee():
+                for chunk in iter_content(chunk_size):
+                    body.extend(chunk)
+                    yield chunk
+                self.store(url, response, bytes(body))
+
+            if decode_unicode:
+                return requests.utils.stream_decode_response_unicode(tee(), response)
+            return tee()
+
+        response.iter_content = teeing
+
+    def revalidated(self, url, entry, response):
+        """Ответ 304: обновляет запись и возвращает ответ 200 с телом из кэша"""
+        body, content_type, _, _ = entry
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'UPDATE responses SET validated = ?, accessed = ? WHERE url = ?', (now, now, url)
+            )
+            self._db.commit()
+            self._stats['hits'] += 1
+            self._stats['bytes_saved'] += len(body)
+
+        cached = requests.Response()
+        cached.status_code = 200
+        cached.reason = 'OK'
+        cached.headers = requests.structures.CaseInsensitiveDict(response.headers)
+        if content_type:
+            cached.headers['Content-Type'] = content_type
+        cached._content = body
+        cached._content_consumed = True
+        cached.encoding = requests.utils.get_encoding_from_headers(cached.headers)
+        cached.url = response.url
+        cached.request = response.request
+        cached.elapsed = response.elapsed
+        cached.history = response.history
+        cached.connection_timings = getattr(response, 'connection_timings', {})
+        cached.throttle_retries = getattr(response, 'throttle_retries', 0)
+        response.close()
+        return cached
+
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute('SELECT url, size FROM responses ORDER BY accessed DESC').fetchall()
+        kept = 0
+        for url, size in rows:
+            kept += size
+            if kept > self.max_bytes:
+                self._db.execute('DELETE FROM responses WHERE url = ?', (url,))
+                self._stats['evicted'] += 1
+
+    def stats(self):
+        """Статистика: обращения, попадания (304), доля попаданий, сэкономленные байты"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['hit_rate'] = stats['hits'] / stats['lookups'] if stats['lookups'] else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Времена установки соединения для текущего запроса в этом потоке
+_connection_timings = threading.local()
+
+def _record_connection_timing(stage, seconds):
+    timings = getattr(_connection_timings, 'current', None)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+class TimedHTTPConnection(HTTPConnection):
+    """Соединение urllib3, замеряющее DNS и установку TCP-соединения
+
+    Имя разрешается отдельно, и сокет открывается по первому адресу; если
+    к нему подключиться не удалось, используется обычный путь urllib3.
+    """
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        try:
+            address = socket.getaddrinfo(self._dns_host, self.port, type=socket.SOCK_STREAM)[0][4][0]
+        except OSError:
+            return super()._new_conn()
+        resolved = time.perf_counter()
+        _record_connection_timing('dns', resolved - started)
+
+        host = self._dns_host
+        self._dns_host = address
+        try:
+            sock = super()._new_conn()
+        except NewConnectionError:
+            self._dns_host = host
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = host
+        _record_connection_timing('connect', time.perf_counter() - resolved)
+        return sock
+
+class TimedHTTPSConnection(TimedHTTPConnection, HTTPSConnection):
+    """HTTPS-соединение, дополнительно замеряющее TLS-рукопожатие"""
+
+    def connect(self):
+        started = time.perf_counter()
+        before = dict(getattr(_connection_timings, 'current', None) or {})
+        super().connect()
+        timings = getattr(_connection_timings, 'current', None) or {}
+        opened = sum(timings.get(stage, 0.0) - before.get(stage, 0.0) for stage in ('dns', 'connect'))
+        _record_connection_timing('tls', time.perf_counter() - started - opened)
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter, пулы которого используют соединения с замером времени"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу (fraction от 0 до 1)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+class CrawlMetrics:
+    """Метрики обхода: события в формате JSON lines и итоговая сводка
+
+    Для каждой страницы записываются времена этапов (dns, connect, tls -
+    только для новых соединений; ttfb - до заголовков ответа; download -
+    чтение тела; parse - разбор), байты по сети, найденные названия и
+    повторы запросов. Остальные события (ошибки, повторы диапазонов,
+    переход на HTML) пишутся как есть. Если stream не задан, события только
+    учитываются в сводке. С profile=True функции разбора выполняются под
+    cProfile (отдельный профилировщик на поток), см. profile_stats().
+    """
+
+    STAGES = ('dns', 'connect', 'tls', 'ttfb', 'download', 'parse')
+
+    def __init__(self, stream=None, profile=False):
+        self.stream = stream
+        self.profile = profile
+        self.started = time.perf_counter()
+        self.stages = {stage: [] for stage in self.STAGES}
+        self.counters = defaultdict(int)
+        self._lock = threading.Lock()
+        self._profilers = []
+        self._local = threading.local()
+
+    def event(self, event, **fields):
+        """Записывает событие и увеличивает его счётчик"""
+        record = {'event': event, 'time': round(time.time(), 3), **fields}
+        with self._lock:
+            self.counters[event] += 1
+            if self.stream is not None:
+                self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+                self.stream.flush()
+
+    def page(self, url, kind, response, titles, download, parse):
+        """Записывает метрики одной страницы (kind - html или api)"""
+        timings = dict(getattr(response, 'connection_timings', None) or {})
+        timings['ttfb'] = response.elapsed.total_seconds()
+        timings['download'] = download
+        timings['parse'] = parse
+        raw = response.raw
+        retries = getattr(response, 'throttle_retries', 0)
+        if raw is not None and raw.retries is not None:
+            retries += len(raw.retries.history)
+        size = raw.tell() if raw is not None else 0
+
+        with self._lock:
+            for stage, seconds in timings.items():
+                self.stages[stage].append(seconds)
+            self.counters['titles'] += titles
+            self.counters['bytes'] += size
+            self.counters['retries'] += retries
+            self.counters['cached'] += raw is None
+        self.event(
+            'page', kind=kind, url=url, status=response.status_code, bytes=size,
+            titles=titles, retries=retries, cached=raw is None,
+            **{stage: round(seconds, 6) for stage, seconds in timings.items()},
+        )
+
+    def profiled(self, func, *args, **kwargs):
+        """Вызывает функцию разбора, под cProfile, если он включён"""
+        if not self.profile:
+            return func(*args, **kwargs)
+        profiler = getattr(self._local, 'profiler', None)
+        if profiler is None:
+            profiler = self._local.profiler = cProfile.Profile()
+            with self._lock:
+                self._profilers.append(profiler)
+        return profiler.runcall(func, *args, **kwargs)
+
+    def profile_stats(self):
+        """pstats.Stats по всем потокам или None, если профилирование выключено"""
+        with self._lock:
+            profilers = list(self._profilers)
+        if not profilers:
+            return None
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        return stats
+
+    def summary(self):
+        """Сводка: p50/p95/сумма по этапам, счётчики и скорость обхода"""
+        with self._lock:
+            elapsed = time.perf_counter() - self.started
+            pages = self.counters['page']
+            summary = {
+                'elapsed': round(elapsed, 3),
+                'pages': pages,
+                'pages_per_s': round(pages / elapsed, 2) if elapsed else None,
+                'titles_per_s': round(self.counters['titles'] / elapsed, 2) if elapsed else None,
+                'counters': dict(self.counters),
+                'stages': {},
+            }
+            for stage, values in self.stages.items():
+                if values:
+                    summary['stages'][stage] = {
+                        'count': len(values),
+                        'p50': round(percentile(values, 0.5), 6),
+                        'p95': round(percentile(values, 0.95), 6),
+                        'total': round(sum(values), 6),
+                    }
+        return summary
+
+class NullMetrics(CrawlMetrics):
+    """Метрики, которые ничего не записывают: для сессий без своих метрик"""
+
+    def event(self, event, **fields):
+        pass
+
+    def page(self, url, kind, response, titles, download, parse):
+        pass
+
+NULL_METRICS = NullMetrics()
+
+def session_metrics(session):
+    """Метрики сессии; у обычной requests.Session их нет, и тогда возвращается заглушка"""
+    return getattr(session, 'metrics', None) or NULL_METRICS
+
+def timed_iter(iterable, timer):
+    """Пропускает элементы, прибавляя к timer[0] время их получения"""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timer[0] += time.perf_counter() - started
+            return
+        timer[0] += time.perf_counter() - started
+        yield item
+
+class CrawlerSession(requests.Session):
+    """Сессия requests с таймаутами по умолчанию и общим ограничителем частоты
+
+    Если задан limiter, каждый запрос ждёт разрешения ограничителя, а ответы
+    с просьбой подождать повторяются до throttle_retries раз. Если задан
+    cache, GET-запросы к уже сохранённым URL идут с If-None-Match и
+    If-Modified-Since, а на 304 возвращается тело из кэша. Ответы stream=True
+    не буферизуются ради кэша: тело сохраняется, когда вызывающий дочитает
+    его до конца. В metrics
+    (CrawlMetrics) функции обхода записывают метрики страниц и события; к
+    каждому ответу сессия добавляет времена установки соединения
+    (connection_timings) и число повторов из-за ограничения частоты
+    (throttle_retries).
+    """
+
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), limiter=None,
+                 throttle_retries=5, cache=None, metrics=None):
+        super().__init__()
+        self.timeout = timeout
+        self.limiter = limiter
+        self.throttle_retries = throttle_retries
+        self.cache = cache
+        self.metrics = metrics or CrawlMetrics()
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if self.cache is None or method.upper() != 'GET':
+            return self._send(method, url, **kwargs)
+
+        key = requests.Request(method, url, params=kwargs.get('params')).prepare().url
+        entry = self.cache.lookup(key)
+        if entry is not None:
+            _, _, etag, last_modified = entry
+            headers = dict(kwargs.get('headers') or {})
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+            kwargs['headers'] = headers
+
+        response = self._send(method, url, **kwargs)
+        if entry is not None and response.status_code == 304:
+            return self.cache.revalidated(key, entry, response)
+        if response.status_code == 200:
+            if kwargs.get('stream'):
+                self.cache.store_when_read(key, response)
+            else:
+                self.cache.store(key, response)
+        return response
+
+    def _send(self, method, url, **kwargs):
+        _connection_timings.current = timings = {}
+        try:
+            if self.limiter is None:
+                response = super().request(method, url, **kwargs)
+                attempt = 0
+            else:
+                for attempt in range(self.throttle_retries + 1):
+                    self.limiter.acquire()
+                    response = super().request(method, url, **kwargs)
+                    if not is_throttled(response):
+                        self.limiter.succeeded()
+                        break
+                    self.limiter.throttled(parse_retry_after(response.headers.get('Retry-After')))
+        finally:
+            _connection_timings.current = None
+        response.connection_timings = timings
+        response.throttle_retries = attempt
+        return response
+
+def create_session(pool_size=10, retries=3, backoff_factor=0.5,
+                   timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), limiter=None, cache=None,
+                   metrics=None):
+    """Создаёт сессию с пулом keep-alive соединений, сжатием и повторами
+
+    pool_size - число соединений к одному хосту, которые держит пул;
+    retries и backoff_factor - повторы при сетевых ошибках и ответах
+    5xx с экспоненциальной паузой (с учётом Retry-After);
+    timeout - пара (connect, read) в секундах;
+    limiter - общий RateLimiter; если он задан, ответы 429/503 обрабатывает
+    он, а не повторы urllib3;
+    cache - HttpCache для условных запросов;
+    metrics - CrawlMetrics (по умолчанию новые, без вывода событий).
+    """
+    if limiter is None:
+        status_forcelist = (429, 500, 502, 503, 504)
+    else:
+        status_forcelist = tuple(
+            status for status in (429, 500, 502, 503, 504) if status not in THROTTLE_STATUSES
+        )
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        respect_retry_after_header=limiter is None,
+        raise_on_status=False,
+    )
+    adapter = TimedHTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+
+    session = CrawlerSession(timeout, limiter, cache=cache, metrics=metrics)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+    })
+    return session
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Общая сессия модуля с ограничителем частоты; создаётся при первом обращении
+
+    HTTP-кэш по умолчанию не подключается, чтобы вызовы функций модуля не
+    создавали файлов в текущем каталоге: его включает main с --cache или
+    присваивание session.cache = HttpCache(path).
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session(limiter=RateLimiter())
+        return _session
+
+# Блоки страницы категории: id блока, параметр ссылки вперёд и параметр
+# ссылки назад. Статьи листаются по pagefrom, подкатегории - по subcatfrom.
+CATEGORY_BLOCKS = {
+    'pages': ('mw-pages', 'pagefrom', 'pageuntil'),
+    'subcategories': ('mw-subcategories', 'subcatfrom', 'subcatuntil'),
+}
+
+class CategoryPageParser(HTMLParser):
+    """Однопроходный разбор одного блока страницы категории
+
+    По умолчанию это блок статей #mw-pages, с block='subcategories' - блок
+    подкатегорий #mw-subcategories. Собирает названия (ссылки с title) и
+    первую ссылку вперёд (pagefrom= или subcatfrom=) на следующую страницу,
+    всё остальное пропускается без построения дерева. После закрытия блока
+    выставляет done, дальше разбирать нечего.
+    """
+
+    def __init__(self, block='pages'):
+        super().__init__(convert_charrefs=True)
+        self.block_id, next_param, prev_param = CATEGORY_BLOCKS[block]
+        self._next_marker = next_param + '='
+        self._prev_marker = prev_param + '='
+        self.titles = []
+        self.next_href = None
+        self.done = False
+        # Глубина вложенных div внутри блока, 0 - вне блока
+        self._depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'div':
+            if self._depth:
+                self._depth += 1
+            elif ('id', self.block_id) in attrs:
+                self._depth = 1
+        elif tag == 'a' and self._depth:
+            attrs = dict(attrs)
+            href = attrs.get('href') or ''
+            if self._next_marker in href or self._prev_marker in href:
+                if self.next_href is None and self._next_marker in href:
+                    self.next_href = href
+                return
+            title = (attrs.get('title') or '').strip()
+            if title:
+                self.titles.append(title)
+
+    def handle_endtag(self, tag):
+        if tag == 'div' and self._depth and not self.done:
+            self._depth -= 1
+            self.done = not self._depth
+
+def parse_category_page(chunks, block='pages'):
+    """Разбирает страницу категории из потока фрагментов текста
+
+    Текст до нужного блока пропускается поиском подстроки id="...", в
+    парсер попадает только сам блок. Возвращает (названия, href следующей
+    страницы или None).
+    """
+    parser = CategoryPageParser(block)
+    marker = f'id="{parser.block_id}"'
+    pending = ''
+    for chunk in chunks:
+        if pending is not None:
+            pending += chunk
+            position = pending.find(marker)
+            if position < 0:
+                # Хвост сохраняется на случай, если тег разрезан между фрагментами
+                pending = pending[-256:]
+                continue
+            chunk = pending[max(pending.rfind('<', 0, position), 0):]
+            pending = None
+        parser.feed(chunk)
+        if parser.done:
+            break
+    parser.close()
+    return parser.titles, parser.next_href
+
+def page_sortkey(url):
+    """Ключ сортировки, с которого начинается страница категории по url
+
+    Ссылка вперёд передаёт его в pagefrom (или subcatfrom) в виде
+    «КЛЮЧ\nНазвание». Ключ может не совпадать с названием (DEFAULTSORT),
+    поэтому границы диапазонов сравниваются с ним, а не с названиями.
+    """
+    query = parse_qs(urlsplit(url).query)
+    value = (query.get('pagefrom') or query.get('subcatfrom') or [''])[0]
+    return value.split('\n', 1)[0].upper()
+
+def iter_response_text(response, chunk_size=16 * 1024):
+    """Декодирует тело потокового ответа по частям"""
+    # Без charset requests считает text/html кодировкой ISO-8859-1
+    if 'charset' in response.headers.get('Content-Type', ''):
+        encoding = response.encoding
+    else:
+        encoding = 'utf-8'
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    for chunk in response.iter_content(chunk_size):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+def fetch_category_page(url, session=None, block='pages'):
+    """Загружает страницу категории и разбирает её по мере получения
+
+    Возвращает (названия из блока block, абсолютный URL следующей страницы
+    или None). Остаток тела после блока дочитывается без разбора, чтобы
+    соединение вернулось в пул.
+    """
+    session = session or get_session()
+    with session.get(url, stream=True) as response:
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        animals = []
-        
-        # Ищем все ссылки в категории
-        category_links = soup.find('div', {'class': 'mw-category-group'})
-        if category_links:
-            links = category_links.find_all('a')
-            for link in links:
-                title = link.get('title', '').strip()
-                if title:
-                    animals.append(title)
-        
-        # Также ищем в других группах категорий
-        category_groups = soup.find_all('div', {'class': 'mw-category-group'})
-        for group in category_groups:
-            links = group.find_all('a')
-            for link in links:
-                title = link.get('title', '').strip()
-                if title and title not in animals:
-                    animals.append(title)
-        
-        return animals
+        download = [0.0]
+        chunks = timed_iter(iter_response_text(response), download)
+        started = time.perf_counter()
+        titles, next_href = session_metrics(session).profiled(parse_category_page, chunks, block)
+        for _ in chunks:
+            pass
+        body_time = time.perf_counter() - started
+    session_metrics(session).page(url, 'html', response, len(titles), download[0], body_time - download[0])
+    return titles, urljoin(url, next_href) if next_href else None
+
+def get_animals_from_page(url, session=None):
+    """Получает список животных с одной страницы категории"""
+    try:
+        animals, _ = fetch_category_page(url, session)
+        return list(dict.fromkeys(animals))
     except Exception as e:
         print(f"Ошибка при обработке {url}: {e}")
         return []
 
-def get_all_animals():
-    """Получает полный список всех животных из категории"""
-    base_url = "https://ru.wikipedia.org/wiki/Категория:Животные_по_алфавиту"
-    all_animals = []
-    
-    page_url = base_url
-    visited_urls = set()
-    page_count = 0
-    
-    while page_url and page_url not in visited_urls:
-        page_count += 1
-        print(f"Обрабатываем страницу {page_count}: {page_url}")
-        visited_urls.add(page_url)
-        
-        try:
-            response = requests.get(page_url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Получаем животных с текущей страницы
-            animals = get_animals_from_current_page(soup)
-            all_animals.extend(animals)
-            print(f"Найдено {len(animals)} записей на этой странице")
-            
-            # Ищем ссылку на следующую страницу
+WIKI_ROOT = "https://ru.wikipedia.org"
+CATEGORY_TITLE = "Категория:Животные_по_алфавиту"
+API_PATH = "/w/api.php"
+
+def iter_category_pages_html(start_url, session=None, end=None, visited=()):
+    """Постранично обходит HTML-страницы категории (по 200 записей)
+
+    Генератор выдаёт тройки (URL страницы, названия, URL следующей страницы
+    или None). Ошибки сети пробрасываются наружу, уже полученные страницы
+    остаются у вызывающего. Если задан end, обход останавливается на
+    странице, после которой начинаются ключи сортировки от end (начало
+    следующего диапазона). Страницы из visited (уже пройденные в прошлых запусках)
+    повторно не загружаются.
+    """
+    page_url = start_url
+    seen_urls = set()
+
+    while page_url and page_url not in seen_urls and page_url not in visited:
+        seen_urls.add(page_url)
+        animals, next_page = fetch_category_page(page_url, session)
+
+        if end is not None and next_page and page_sortkey(next_page) >= end:
             next_page = None
-            
-            # Метод 1: Ищем в навигации по страницам
-            nav_div = soup.find('div', {'id': 'mw-pages'})
-            if nav_div:
-                nav_links = nav_div.find_all('a')
-                for link in nav_links:
-                    href = link.get('href', '')
-                    if 'pagefrom=' in href:
-                        next_page = "https://ru.wikipedia.org" + href
-                        break
-            
-            # Метод 2: Ищем в категории
-            if not next_page:
-                category_nav = soup.find('div', {'class': 'mw-category-generated'})
-                if category_nav:
-                    nav_links = category_nav.find_all('a')
-                    for link in nav_links:
-                        href = link.get('href', '')
-                        if 'pagefrom=' in href:
-                            next_page = "https://ru.wikipedia.org" + href
-                            break
-            
-            # Метод 3: Ищем любые ссылки с pagefrom
-            if not next_page:
-                pagefrom_links = soup.find_all('a', href=re.compile(r'pagefrom='))
-                for link in pagefrom_links:
-                    href = link.get('href', '')
-                    full_url = "https://ru.wikipedia.org" + href
-                    if full_url not in visited_urls:
-                        next_page = full_url
-                        break
-            
+        yield page_url, animals, next_page
+        page_url = next_page
+
+def iter_category_pages_api(category=CATEGORY_TITLE, wiki_root=WIKI_ROOT, session=None,
+                            start=None, end=None, continuation=None):
+    """Постранично получает страницы категории через MediaWiki API
+
+    Использует list=categorymembers с cmlimit=max (до 500 записей на запрос)
+    и продолжением по cmcontinue; запрашивается только название. Генератор
+    выдаёт пары (названия, параметры продолжения или None на последней
+    странице); ошибки сети и API пробрасываются наружу. Обход можно начать
+    с сохранённых параметров continuation.
+    start и end ограничивают обход диапазоном ключей сортировки [start, end).
+    Запросы передают maxlag, паузы между ними задаёт ограничитель сессии.
+    """
+    session = session or get_session()
+    api_url = wiki_root + API_PATH
+    params = {
+        'action': 'query',
+        'list': 'categorymembers',
+        'cmtitle': category.replace('_', ' '),
+        'cmtype': 'page',
+        'cmprop': 'title',
+        'cmlimit': 'max',
+        'format': 'json',
+        'formatversion': '2',
+        'maxlag': MAXLAG,
+    }
+    if start or end:
+        params['cmsort'] = 'sortkey'
+    if start:
+        params['cmstartsortkeyprefix'] = start
+    if end:
+        params['cmendsortkeyprefix'] = end
+    continuation = continuation or {}
+    metrics = session_metrics(session)
+
+    while True:
+        response = session.get(api_url, params={**params, **continuation}, stream=True)
+        response.raise_for_status()
+        started = time.perf_counter()
+        body = response.content
+        downloaded = time.perf_counter()
+        data = metrics.profiled(json.loads, body)
+        if 'error' in data:
+            raise ApiError(data['error'])
+
+        animals = [member['title'] for member in data['query']['categorymembers']]
+        metrics.page(response.url, 'api', response, len(animals), downloaded - started,
+                     time.perf_counter() - downloaded)
+        continuation = data.get('continue')
+        yield animals, continuation
+
+        if continuation is None:
+            break
+
+# Буквы - границы диапазонов для параллельного обхода. Ё не используется
+# как граница: в зависимости от сортировки категории она стоит рядом с Е
+# или до А, и в обоих случаях попадает в соседний диапазон.
+RANGE_LETTERS = 'АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ'
+
+def alphabet_ranges(parts, letters=RANGE_LETTERS):
+    """Делит алфавит на parts последовательных диапазонов (start, end)
+
+    Первый диапазон начинается с начала категории (start=None), последний
+    идёт до её конца (end=None), так что вместе они покрывают всю категорию.
+    """
+    parts = max(1, min(parts, len(letters)))
+    bounds = [letters[len(letters) * i // parts] for i in range(1, parts)]
+    starts = [None] + bounds
+    ends = bounds + [None]
+    return list(zip(starts, ends))
+
+class TitleHashSet:
+    """Множество названий, хранящее только их 64-битные хеши (blake2b)
+
+    Вместо строк в памяти лежат целые числа; вероятность ложного
+    совпадения для миллиона названий - порядка 10^-8.
+    """
+
+    def __init__(self):
+        self._hashes = set()
+
+    @staticmethod
+    def _hash(title):
+        digest = hashlib.blake2b(title.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+    def add(self, title):
+        """Добавляет название; возвращает True, если его ещё не было"""
+        digest = self._hash(title)
+        if digest in self._hashes:
+            return False
+        self._hashes.add(digest)
+        return True
+
+    def __contains__(self, title):
+        return self._hash(title) in self._hashes
+
+    def __len__(self):
+        return len(self._hashes)
+
+class BloomFilter:
+    """Фильтр Блума для отсева повторов с памятью, не зависящей от числа названий
+
+    Размер битового массива и число хеш-функций подбираются под capacity
+    названий и долю ложных срабатываний error_rate: с такой вероятностью
+    новое название будет принято за повтор и не будет посчитано.
+    """
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, title):
+        digest = hashlib.blake2b(title.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            position = (first + i * second) % self.size
+            yield position >> 3, 1 << (position & 7)
+
+    def add(self, title):
+        """Добавляет название; возвращает True, если его (вероятно) ещё не было"""
+        is_new = False
+        for byte, mask in self._positions(title):
+            if not self._bits[byte] & mask:
+                self._bits[byte] |= mask
+                is_new = True
+        return is_new
+
+    def __contains__(self, title):
+        return all(self._bits[byte] & mask for byte, mask in self._positions(title))
+
+def iter_titles(pages):
+    """Названия из потока страниц по одному"""
+    for animals in pages:
+        yield from animals
+
+def unique_titles(titles, seen=None):
+    """Пропускает только названия, которых ещё нет в seen (TitleHashSet или BloomFilter)"""
+    seen = TitleHashSet() if seen is None else seen
+    for title in titles:
+        if seen.add(title):
+            yield title
+
+def count_unique_titles(pages, seen=None):
+    """Считает названия по буквам за один проход, не собирая их в список
+
+    Конвейер: страницы -> названия -> без повторов -> первая буква -> счётчики.
+    """
+    return count_animals_by_letter(unique_titles(iter_titles(pages), seen))
+
+CHECKPOINT_PATH = "beasts_checkpoint.json"
+
+class CrawlState:
+    """Состояние обхода с контрольной точкой на диске
+
+    Для каждого диапазона хранятся режим (api/html), курсор следующей
+    страницы (параметры cmcontinue или URL с pagefrom), признак завершения
+    и число неудачных попыток; кроме того - пройденные HTML-страницы и
+    счётчики по буквам. Новые названия дописываются в журнал path +
+    '.titles', а сама контрольная точка после каждой страницы атомарно
+    перезаписывается (временный файл и os.replace) вместе с длиной журнала,
+    до которой он согласован с ней. При запуске с существующей контрольной
+    точкой журнал обрезается до этой длины и обход продолжается с курсоров.
+    Без path состояние живёт только в памяти.
+
+    Повторы отсеиваются через seen (по умолчанию TitleHashSet), названия
+    считаются по буквам по мере поступления. Список названий хранится в
+    памяти, только если keep_titles.
+    """
+
+    def __init__(self, path=None, category=None, ranges=None, seen=None, keep_titles=True):
+        self.path = path
+        self.category = category
+        self.ranges = ranges or [(None, None)]
+        self.progress = {}
+        self.visited = set()
+        self.counts = defaultdict(int)
+        # Число различных названий, включая не начинающиеся с русской буквы
+        self.total = 0
+        self.titles = []
+        self.keep_titles = keep_titles
+        self._seen = TitleHashSet() if seen is None else seen
+        self._journal = None
+        self._journal_size = 0
+        self._lock = threading.Lock()
+        if path is not None:
+            self._load()
+
+    @property
+    def journal_path(self):
+        return self.path + '.titles'
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as file:
+                data = json.load(file)
+            if data['category'] != self.category:
+                raise ValueError(
+                    f"Контрольная точка {self.path} относится к категории {data['category']}"
+                )
+            self.ranges = [tuple(bounds) for bounds in data['ranges']]
+            self.progress = {int(index): entry for index, entry in data['progress'].items()}
+            self.visited = set(data['visited'])
+            self.counts.update(data['counts'])
+            self.total = data['total']
+            self._journal_size = data['journal_size']
+        elif os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+        self._journal = open(self.journal_path, 'a+b')
+        # Хвост, записанный после последней контрольной точки, отбрасывается
+        self._journal.truncate(self._journal_size)
+        self._journal.seek(0)
+        for line in self._journal:
+            index, title = line.decode('utf-8').rstrip('\n').split('\t', 1)
+            self._seen.add(title)
+            if self.keep_titles:
+                self.titles.append((int(index), title))
+        self._journal.seek(0, os.SEEK_END)
+
+    def entry(self, index, mode):
+        """Прогресс диапазона index; создаётся при первом обращении"""
+        with self._lock:
+            return self.progress.setdefault(
+                index, {'mode': mode, 'cursor': None, 'done': False, 'attempts': 0}
+            )
+
+    def pending(self):
+        """Номера диапазонов, которые ещё не пройдены до конца"""
+        return [
+            index for index in range(len(self.ranges))
+            if not self.progress.get(index, {}).get('done')
+        ]
+
+    def page_done(self, index, animals, cursor, url=None):
+        """Учитывает успешно полученную страницу и сохраняет контрольную точку"""
+        with self._lock:
+            new_titles = list(unique_titles(animals, self._seen))
+            self.total += len(new_titles)
+            for letter, count in count_animals_by_letter(new_titles).items():
+                self.counts[letter] += count
+            if self.keep_titles:
+                self.titles.extend((index, title) for title in new_titles)
+            if url is not None:
+                self.visited.add(url)
+
+            entry = self.progress[index]
+            entry['cursor'] = cursor
+            entry['done'] = cursor is None
+            entry['attempts'] = 0
+            if self._journal is not None and new_titles:
+                self._journal.write(''.join(
+                    f"{index}\t{title}\n" for title in new_titles
+                ).encode('utf-8'))
+                self._journal.flush()
+                self._journal_size = self._journal.tell()
+            self._save()
+
+    def page_failed(self, index, error):
+        """Учитывает ошибку: диапазон остаётся в очереди повторов со своим курсором"""
+        with self._lock:
+            entry = self.progress[index]
+            entry['attempts'] += 1
+            entry['error'] = str(error)
+            self._save()
+
+    def switch_mode(self, index, mode):
+        """Начинает диапазон заново в другом режиме"""
+        with self._lock:
+            self.progress[index].update(mode=mode, cursor=None, done=False)
+            self._save()
+
+    def result(self):
+        """Все собранные названия в порядке диапазонов"""
+        with self._lock:
+            return [title for _, title in sorted(self.titles, key=lambda item: item[0])]
+
+    def _save(self):
+        if self.path is None:
+            return
+        data = {
+            'category': self.category,
+            'ranges': self.ranges,
+            'progress': self.progress,
+            'visited': sorted(self.visited),
+            'counts': self.counts,
+            'total': self.total,
+            'journal_size': self._journal_size,
+        }
+        os.fsync(self._journal.fileno())
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile(
+            'w', encoding='utf-8', dir=directory, delete=False, suffix='.tmp'
+        ) as file:
+            json.dump(data, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(file.name, self.path)
+
+    def close(self, complete=False):
+        """Закрывает журнал; после полного обхода удаляет файлы состояния"""
+        if self._journal is None:
+            return
+        self._journal.close()
+        self._journal = None
+        if complete:
+            os.remove(self.journal_path)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+def is_api_unavailable(error):
+    """Ошибка означает, что API не годится для обхода, а не временный сбой
+
+    Сюда относятся ответы API с ошибкой, неразборчивый ответ и ответы 4xx.
+    Временными считаются сбои сети, ответы 5xx и просьбы сервера подождать:
+    429, отказ по maxlag и другие TEMPORARY_API_ERRORS.
+    """
+    if isinstance(error, ApiError):
+        return not error.temporary
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status is not None and status < 500 and status not in THROTTLE_STATUSES
+    return isinstance(error, ValueError) or not isinstance(error, requests.RequestException)
+
+def crawl_range(state, index, mode='auto', wiki_root=WIKI_ROOT, category=CATEGORY_TITLE,
+                session=None):
+    """Обходит диапазон index состояния state с его курсора
+
+    Каждая полученная страница сразу попадает в state. При ошибке сети
+    диапазон отмечается как неудачный и остаётся в очереди повторов; при
+    ошибке API в режиме auto диапазон начинается заново через HTML.
+    """
+    session = session or get_session()
+    start, end = state.ranges[index]
+    entry = state.entry(index, 'html' if mode == 'html' else 'api')
+
+    if entry['mode'] == 'api':
+        try:
+            pages = iter_category_pages_api(
+                category, wiki_root, session, start, end, entry['cursor']
+            )
+            for animals, continuation in pages:
+                state.page_done(index, animals, continuation)
+            return
+        except Exception as e:
+            session_metrics(session).event('error', kind='api', category=category, range=index, error=str(e))
+            if mode == 'api' or not is_api_unavailable(e):
+                state.page_failed(index, e)
+                return
+            session_metrics(session).event('fallback', category=category, range=index, mode='html')
+            state.switch_mode(index, 'html')
+
+    if entry['cursor']:
+        page_url = entry['cursor']
+    elif start:
+        page_url = f"{wiki_root}/w/index.php?{urlencode({'title': category, 'pagefrom': start})}"
+    else:
+        page_url = f"{wiki_root}/wiki/{category}"
+    try:
+        for url, animals, next_page in iter_category_pages_html(
+            page_url, session, end, state.visited
+        ):
             page_url = next_page
-            time.sleep(1)
-            
+            state.page_done(index, animals, next_page, url)
+        if page_url is not None:
+            # Обход упёрся в уже пройденную страницу
+            state.page_done(index, [], None)
+    except Exception as e:
+        session_metrics(session).event(
+            'error', kind='html', category=category, range=index, url=page_url, error=str(e)
+        )
+        state.page_failed(index, e)
+
+def crawl(mode='auto', wiki_root=WIKI_ROOT, category=CATEGORY_TITLE, session=None, workers=1,
+          parts=None, checkpoint=None, max_attempts=3, seen=None, keep_titles=True):
+    """Обходит категорию и возвращает итоговое состояние CrawlState
+
+    Параметры описаны у get_all_animals; keep_titles=False не сохраняет
+    названия в памяти, остаются только счётчики по буквам.
+    """
+    if mode not in ('auto', 'api', 'html'):
+        raise ValueError(f"Неизвестный режим: {mode}")
+
+    ranges = [(None, None)] if workers <= 1 else alphabet_ranges(parts or workers * 2)
+    state = CrawlState(checkpoint, category, ranges, seen, keep_titles)
+    if session is None:
+        session = get_session()
+        if workers > 1:
+            session = create_session(pool_size=workers, limiter=session.limiter,
+                                     cache=session.cache, metrics=session.metrics)
+    if state.progress:
+        session_metrics(session).event('resume', category=category, checkpoint=checkpoint,
+                              titles=state.total)
+
+    try:
+        for attempt in range(max_attempts):
+            pending = state.pending()
+            if not pending:
+                break
+            if attempt:
+                session_metrics(session).event('retry', category=category, ranges=len(pending))
+            if workers <= 1:
+                for index in pending:
+                    crawl_range(state, index, mode, wiki_root, category, session)
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = [
+                        executor.submit(crawl_range, state, index, mode, wiki_root, category,
+                                        session)
+                        for index in pending
+                    ]
+                    for future in futures:
+                        future.result()
+
+        pending = state.pending()
+        if pending:
+            session_metrics(session).event('incomplete', category=category, ranges=len(pending))
+    finally:
+        state.close(complete=not state.pending())
+    return state
+
+def get_all_animals(mode='auto', wiki_root=WIKI_ROOT, category=CATEGORY_TITLE, session=None,
+                    workers=1, parts=None, checkpoint=None, max_attempts=3, seen=None):
+    """Получает полный список всех животных из категории
+
+    mode='api' - через MediaWiki API (list=categorymembers), без разбора HTML;
+    mode='html' - разбором HTML-страниц категории;
+    mode='auto' - через API, а при ошибке - заново через HTML.
+    Все запросы идут через одну сессию (по умолчанию общую, get_session()),
+    частоту запросов задаёт её ограничитель.
+
+    При workers > 1 категория делится по алфавиту на parts диапазонов (по
+    умолчанию вдвое больше, чем потоков), которые обходятся параллельно не
+    более чем workers потоками. Каждый диапазон останавливается на начале
+    следующего, результаты объединяются в порядке диапазонов без повторов.
+
+    Диапазоны, на которых случилась ошибка, ставятся в очередь повторов и
+    обходятся заново со страницы ошибки, всего до max_attempts раз. Если
+    задан checkpoint (путь к файлу), после каждой страницы сохраняется
+    контрольная точка, и повторный запуск продолжает обход с последней
+    полученной страницы; после полного обхода файлы состояния удаляются.
+
+    Повторы отсеиваются через seen: TitleHashSet (по умолчанию) или
+    BloomFilter.
+    """
+    return crawl(mode, wiki_root, category, session, workers, parts, checkpoint,
+                 max_attempts, seen).result()
+
+def count_all_animals(mode='auto', wiki_root=WIKI_ROOT, category=CATEGORY_TITLE, session=None,
+                      workers=1, parts=None, checkpoint=None, max_attempts=3, seen=None):
+    """Считает животных категории по первым буквам, не собирая список названий
+
+    Названия считаются по мере получения страниц, в памяти остаются только
+    счётчики и множество seen; с BloomFilter память не растёт с размером
+    категории. Параметры - как у get_all_animals.
+    """
+    state = crawl(mode, wiki_root, category, session, workers, parts, checkpoint,
+                  max_attempts, seen, keep_titles=False)
+    return dict(state.counts)
+
+def category_key(category):
+    """Название категории без различий между пробелами и подчёркиваниями"""
+    return category.replace('_', ' ').strip()
+
+def get_subcategories(category, mode='auto', wiki_root=WIKI_ROOT, session=None):
+    """Список подкатегорий категории (полные названия с префиксом)
+
+    Через API (list=categorymembers, cmtype=subcat) или, в режиме html и
+    при недоступности API в режиме auto, разбором блока #mw-subcategories
+    с переходом по subcatfrom.
+    """
+    session = session or get_session()
+    if mode != 'html':
+        try:
+            params = {
+                'action': 'query',
+                'list': 'categorymembers',
+                'cmtitle': category_key(category),
+                'cmtype': 'subcat',
+                'cmprop': 'title',
+                'cmlimit': 'max',
+                'format': 'json',
+                'formatversion': '2',
+                'maxlag': MAXLAG,
+            }
+            subcategories = []
+            continuation = {}
+            while continuation is not None:
+                response = session.get(wiki_root + API_PATH, params={**params, **continuation})
+                response.raise_for_status()
+                data = response.json()
+                if 'error' in data:
+                    raise ApiError(data['error'])
+                subcategories.extend(member['title'] for member in data['query']['categorymembers'])
+                continuation = data.get('continue')
+            return subcategories
         except Exception as e:
-            print(f"Ошибка при обработке страницы {page_url}: {e}")
-            break
-    
-    print(f"Всего обработано страниц: {page_count}")
-    return all_animals
+            if mode == 'api' or not is_api_unavailable(e):
+                raise
+            session_metrics(session).event('fallback', category=category, mode='html', error=str(e))
+
+    subcategories = []
+    page_url = f"{wiki_root}/wiki/{category}"
+    seen_urls = set()
+    while page_url and page_url not in seen_urls:
+        seen_urls.add(page_url)
+        titles, page_url = fetch_category_page(page_url, session, block='subcategories')
+        subcategories.extend(titles)
+    return subcategories
+
+def crawl_categories(categories, mode='auto', wiki_root=WIKI_ROOT, session=None, workers=8,
+                     recursive=True, max_depth=None, parts=1, max_attempts=3):
+    """Обходит несколько категорий и их деревья подкатегорий общим пулом потоков
+
+    Подкатегории ищутся в ширину: категория, найденная повторно (в том числе
+    по циклу в дереве), второй раз не обходится; max_depth ограничивает
+    глубину (0 - только сами categories). Каждая категория делится на parts
+    алфавитных диапазонов, и загрузка страниц всех диапазонов всех категорий
+    планируется в одном пуле из workers потоков с общими пулом соединений и
+    ограничителем частоты, так что время работы определяет самая длинная
+    категория, а не их сумма. Диапазоны с ошибками ставятся в пул повторно,
+    всего до max_attempts попыток.
+
+    Возвращает словарь {категория: CrawlState} в порядке обнаружения; у
+    каждой категории свои счётчики по буквам и свой отсев повторов.
+    """
+    if mode not in ('auto', 'api', 'html'):
+        raise ValueError(f"Неизвестный режим: {mode}")
+    if session is None:
+        shared = get_session()
+        session = create_session(pool_size=workers, limiter=shared.limiter, cache=shared.cache,
+                                 metrics=shared.metrics)
+
+    ranges = alphabet_ranges(parts) if parts > 1 else [(None, None)]
+    states = {}
+    discovered = set()
+    tasks = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit_range(category, index):
+            future = executor.submit(crawl_range, states[category], index, mode, wiki_root,
+                                     category, session)
+            tasks[future] = ('range', category, index)
+
+        def schedule(category, depth):
+            if category_key(category) in discovered:
+                return
+            discovered.add(category_key(category))
+            states[category] = CrawlState(None, category, ranges, keep_titles=False)
+            for index in range(len(ranges)):
+                submit_range(category, index)
+            if recursive and (max_depth is None or depth < max_depth):
+                future = executor.submit(get_subcategories, category, mode, wiki_root, session)
+                tasks[future] = ('subcategories', category, depth)
+
+        for category in categories:
+            schedule(category, 0)
+
+        while tasks:
+            done, _ = wait(tasks, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, category, detail = tasks.pop(future)
+                if kind == 'subcategories':
+                    try:
+                        subcategories = future.result()
+                    except Exception as e:
+                        session_metrics(session).event(
+                            'error', kind='subcategories', category=category, error=str(e)
+                        )
+                        continue
+                    for subcategory in subcategories:
+                        schedule(subcategory, detail + 1)
+                    continue
+
+                future.result()
+                entry = states[category].progress[detail]
+                if not entry['done'] and entry['attempts'] < max_attempts:
+                    session_metrics(session).event('retry', category=category, ranges=1)
+                    submit_range(category, detail)
+
+    for category, state in states.items():
+        state.close()
+        if state.pending():
+            session_metrics(session).event('incomplete', category=category, ranges=len(state.pending()))
+    return states
+
+def category_filename(category):
+    """Имя CSV-файла для категории: без префикса и недопустимых символов"""
+    name = category_key(category).split(':', 1)[-1]
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', name).strip('_') + '.csv'
+
+def save_categories_to_csv(states, directory='.'):
+    """Сохраняет счётчики каждой категории в свой CSV в формате save_to_csv"""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for category, state in states.items():
+        paths[category] = os.path.join(directory, category_filename(category))
+        save_to_csv(dict(state.counts), paths[category])
+    return paths
+
+# Разбор SQL-дампов Википедии (INSERT INTO ... VALUES (...),(...);)
+SQL_COLUMN = re.compile(r"^\s+`(\w+)`")
+# Шаблоны строк развёрнуты ([^'\\]*(?:\\.[^'\\]*)*): так регулярное выражение
+# обрабатывает строку кусками, а не по символу, что в разы быстрее
+SQL_TUPLE = re.compile(r"\(((?:[^'()]+|'[^'\\]*(?:\\.[^'\\]*)*')*)\)")
+SQL_FIELD = re.compile(r"'([^'\\]*(?:\\.[^'\\]*)*)'|([^,]+)")
+SQL_ESCAPE = re.compile(r"\\(.)")
+SQL_ESCAPES = {'0': '\0', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+
+def parse_sql_values(body):
+    """Разбирает содержимое одного кортежа VALUES в список значений
+
+    Строки возвращаются без кавычек и экранирования, NULL - как None,
+    числа - строками.
+    """
+    values = []
+    for match in SQL_FIELD.finditer(body):
+        quoted, bare = match.groups()
+        if bare is None:
+            if '\\' in quoted:
+                quoted = SQL_ESCAPE.sub(lambda m: SQL_ESCAPES.get(m.group(1), m.group(1)), quoted)
+            values.append(quoted)
+        else:
+            bare = bare.strip()
+            values.append(None if bare == 'NULL' else bare)
+    return values
+
+def open_dump(path):
+    """Открывает дамп (.sql.gz или .sql) как текст с потоковой распаковкой"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, encoding='utf-8', errors='replace')
+
+def iter_sql_dump(path, keep=None):
+    """Потоково читает строки таблицы из SQL-дампа
+
+    Имена столбцов берутся из CREATE TABLE в начале дампа. Дамп читается
+    построчно (одна строка - один INSERT на тысячи кортежей), кортежи
+    выделяются регулярным выражением, и только кортежи, для которых
+    keep(тело кортежа) истинно, разбираются на поля. Выдаёт словари
+    столбец -> значение.
+    """
+    columns = []
+    in_create = False
+    with open_dump(path) as dump:
+        for line in dump:
+            if line.startswith('INSERT INTO'):
+                values_start = line.find(' VALUES ')
+                for match in SQL_TUPLE.finditer(line, values_start):
+                    body = match.group(1)
+                    if keep is None or keep(body):
+                        yield dict(zip(columns, parse_sql_values(body)))
+            elif line.startswith('CREATE TABLE'):
+                in_create = True
+                columns = []
+            elif in_create:
+                column = SQL_COLUMN.match(line)
+                if column:
+                    columns.append(column.group(1))
+                elif line.startswith(')'):
+                    in_create = False
+
+def category_member_ids(categorylinks_path, category=CATEGORY_TITLE):
+    """Идентификаторы статей категории по дампу categorylinks
+
+    Подкатегории и файлы (cl_type) не учитываются. Кортежи без названия
+    категории отсеиваются поиском подстроки, не разбираясь на поля.
+    """
+    name = category.split(':', 1)[-1].replace(' ', '_')
+    needle = "'" + name.replace('\\', '\\\\').replace("'", "\\'") + "'"
+    ids = set()
+    for row in iter_sql_dump(categorylinks_path, lambda body: needle in body):
+        if 'cl_to' not in row:
+            raise ValueError("Дамп categorylinks без столбца cl_to не поддерживается")
+        if row['cl_to'] == name and row.get('cl_type', 'page') == 'page':
+            ids.add(int(row['cl_from']))
+    return ids
+
+def iter_dump_titles(page_path, page_ids, namespace=0):
+    """Названия страниц с идентификаторами page_ids по дампу page"""
+    def keep(body):
+        return int(body[:body.index(',')]) in page_ids
+
+    for row in iter_sql_dump(page_path, keep):
+        if int(row['page_namespace']) == namespace:
+            yield row['page_title'].replace('_', ' ')
+
+def count_animals_from_dumps(categorylinks_path, page_path, category=CATEGORY_TITLE):
+    """Считает животных по буквам по локальным дампам, не обращаясь к сайту
+
+    Сначала по дампу categorylinks собираются идентификаторы статей
+    категории, затем по дампу page - их названия; оба дампа читаются
+    потоково с распаковкой gzip на лету.
+    """
+    page_ids = category_member_ids(categorylinks_path, category)
+    print(f"Статей в категории по дампу categorylinks: {len(page_ids)}")
+    return count_animals_by_letter(iter_dump_titles(page_path, page_ids))
 
 def get_animals_from_current_page(soup):
     """Извлекает животных с текущей страницы"""
@@ -165,20 +1553,36 @@ def save_to_csv(letter_counts, filename='beasts.csv'):
     
     print(f"Результаты сохранены в файл {filename}")
 
-def main():
-    """Основная функция"""
+def emit_run_summary(session, profile_path=None):
+    """Записывает итоговую сводку обхода (с кэшем и ограничителем) и профиль"""
+    summary = session_metrics(session).summary()
+    if getattr(session, 'cache', None) is not None:
+        summary['cache'] = session.cache.stats()
+    if getattr(session, 'limiter', None) is not None:
+        summary['limiter'] = session.limiter.stats()
+    session_metrics(session).event('summary', **summary)
+
+    stats = session_metrics(session).profile_stats()
+    if profile_path and stats is not None:
+        stats.dump_stats(profile_path)
+    return summary
+
+def count_main_category(workers=1):
+    """Обходит категорию животных, выводит статистику и сохраняет beasts.csv
+
+    workers - число потоков загрузки, как у crawl.
+    """
     print("Начинаем сбор данных о животных с Википедии...")
     
-    # Получаем список всех животных
-    animals = get_all_animals()
-    print(f"Всего найдено записей: {len(animals)}")
+    # Обходим категорию, считая животных по буквам по мере получения страниц
+    state = crawl(workers=workers, checkpoint=CHECKPOINT_PATH, keep_titles=False)
+    print(f"Всего найдено записей: {state.total}")
     
-    if not animals:
+    if not state.total:
         print("Не удалось получить данные о животных")
         return
     
-    # Подсчитываем по буквам
-    letter_counts = count_animals_by_letter(animals)
+    letter_counts = dict(state.counts)
     
     # Выводим статистику
     print("\nСтатистика по буквам:")
@@ -195,5 +1599,68 @@ def main():
     
     print("Готово!")
 
+def main(argv=None):
+    """Основная функция
+
+    С параметрами --categorylinks и --page считает по локальным дампам
+    Википедии. С --category обходит указанные категории вместе с деревьями
+    подкатегорий и сохраняет по CSV на категорию. Иначе обходит категорию
+    животных на сайте. Метрики обхода пишутся в JSON lines (--metrics, по
+    умолчанию в stderr) и завершаются сводкой; --profile сохраняет профиль
+    функций разбора, --cache включает HTTP-кэш для повторных запусков.
+    """
+    parser = argparse.ArgumentParser(description="Подсчёт животных по буквам")
+    parser.add_argument('--categorylinks', help="дамп ruwiki-*-categorylinks.sql.gz")
+    parser.add_argument('--page', help="дамп ruwiki-*-page.sql.gz")
+    parser.add_argument('--category', action='append',
+                        help="категория для обхода с подкатегориями (можно несколько)")
+    parser.add_argument('--max-depth', type=int, help="глубина обхода подкатегорий")
+    parser.add_argument('--workers', type=int, default=8, help="число потоков загрузки")
+    parser.add_argument('--output-dir', default='.', help="каталог для CSV по категориям")
+    parser.add_argument('--metrics',
+                        help="файл для метрик обхода в JSON lines (по умолчанию stderr; "
+                             "'-' - стандартный вывод, тогда сообщения идут в stderr)")
+    parser.add_argument('--profile', help="файл для статистики cProfile функций разбора")
+    parser.add_argument('--cache', nargs='?', const=CACHE_PATH,
+                        help=f"HTTP-кэш для условных запросов (без пути - {CACHE_PATH})")
+    args = parser.parse_args(argv)
+    if bool(args.categorylinks) != bool(args.page):
+        parser.error("для работы по дампам нужны оба файла: --categorylinks и --page")
+
+    if args.categorylinks:
+        print("Считаем животных по дампам Википедии...")
+        letter_counts = count_animals_from_dumps(args.categorylinks, args.page)
+        print(f"\nВсего учтено: {sum(letter_counts.values())} записей")
+        save_to_csv(letter_counts)
+        print("Готово!")
+        return
+
+    session = get_session()
+    if args.metrics is None:
+        stream = sys.stderr
+    elif args.metrics == '-':
+        stream = sys.stdout
+    else:
+        stream = open(args.metrics, 'a', encoding='utf-8')
+    session.metrics = CrawlMetrics(stream, profile=bool(args.profile))
+    if args.cache:
+        session.cache = HttpCache(args.cache)
+    # Стандартный вывод с метриками остаётся чистым JSON lines
+    messages = sys.stderr if stream is sys.stdout else sys.stdout
+    try:
+        with contextlib.redirect_stdout(messages):
+            if args.category:
+                states = crawl_categories(args.category, workers=args.workers,
+                                          max_depth=args.max_depth)
+                save_categories_to_csv(states, args.output_dir)
+            else:
+                count_main_category(args.workers)
+            emit_run_summary(session, args.profile)
+    finally:
+        if session.cache is not None:
+            session.cache.close()
+        if stream not in (sys.stdout, sys.stderr):
+            stream.close()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
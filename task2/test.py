@@ -3,6 +3,17 @@ from unittest.mock import patch, Mock, mock_open
 import csv
 import io
 from collections import defaultdict
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from urllib.parse import parse_qs, quote, unquote, urlsplit
 
 # Импортируем функции из основного модуля
 try:
@@ -70,6 +81,187 @@ except ImportError:
         return animals
 
 
+try:
+    import solution
+except ImportError:
+    solution = None
+
+
+class LocalWiki:
+    """Локальная замена Википедии: API categorymembers и HTML-страницы категории"""
+
+    api_page_size = 500
+    html_page_size = 200
+
+    def __init__(self, categories, subcategories=None, sortkeys=None):
+        # categories: название категории (с пробелами) -> список названий страниц;
+        # subcategories: название категории -> названия её подкатегорий;
+        # sortkeys: название -> ключ сортировки, если он отличается от названия
+        self.sortkeys = sortkeys or {}
+        self.categories = {
+            name: sorted(titles, key=self.sortkey) for name, titles in categories.items()
+        }
+        self.subcategories = subcategories or {}
+        # Задержка ответа сервера в секундах
+        self.latency = 0
+        self.requests = []
+        self.connections = set()
+        self.request_headers = []
+        # Статусы, которые сервер вернёт на ближайшие запросы вместо ответа
+        self.failures = []
+        # То же для запросов с заданными порядковыми номерами (с 1)
+        self.failures_at = {}
+        # Сколько раз отдан 304 Not Modified по If-None-Match
+        self.not_modified = 0
+        handler = type('Handler', (LocalWikiHandler,), {'wiki': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.root = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def sortkey(self, title):
+        return self.sortkeys.get(title, title)
+
+    def api(self, query):
+        if query.get('cmtype') == ['subcat']:
+            members = [
+                {'ns': 14, 'title': title}
+                for title in self.subcategories.get(query['cmtitle'][0], [])
+            ]
+            return 'application/json', json.dumps(
+                {'batchcomplete': True, 'query': {'categorymembers': members}}, ensure_ascii=False
+            )
+
+        titles = self.categories[query['cmtitle'][0]]
+        prefix_from = query.get('cmstartsortkeyprefix', [''])[0]
+        prefix_until = query.get('cmendsortkeyprefix', [None])[0]
+        titles = [
+            title for title in titles
+            if self.sortkey(title) >= prefix_from
+            and (prefix_until is None or self.sortkey(title) < prefix_until)
+        ]
+        start = int(query.get('cmcontinue', ['0'])[0])
+        end = start + self.api_page_size
+        data = {
+            'batchcomplete': True,
+            'query': {'categorymembers': [
+                {'ns': 0, 'title': title} for title in titles[start:end]
+            ]},
+        }
+        if end < len(titles):
+            data['continue'] = {'cmcontinue': str(end), 'continue': '-||'}
+        return 'application/json', json.dumps(data, ensure_ascii=False)
+
+    def html(self, category, query):
+        titles = self.categories[category.replace('_', ' ')]
+        # Как в MediaWiki, pagefrom - ключ сортировки, за ним может идти
+        # перевод строки и название
+        pagefrom = query.get('pagefrom', [''])[0]
+        page = [
+            title for title in titles if f"{self.sortkey(title)}\n{title}" >= pagefrom
+        ][:self.html_page_size + 1]
+        links = ''.join(
+            f'<li><a href="/wiki/{quote(title)}" title="{title}">{title}</a></li>'
+            for title in page[:self.html_page_size]
+        )
+        navigation = ''
+        if len(page) > self.html_page_size:
+            pagefrom = quote(f"{self.sortkey(page[-1])}\n{page[-1]}")
+            href = f"/w/index.php?title={quote(category)}&amp;pagefrom={pagefrom}#mw-pages"
+            navigation = f'(<a href="{href}" title="{category}">Следующая страница</a>)'
+        subcategories = ''.join(
+            f'<li><a href="/wiki/{quote(title)}" title="{title}">{title}</a></li>'
+            for title in self.subcategories.get(category.replace('_', ' '), [])
+        )
+        if subcategories:
+            subcategories = (
+                '<div id="mw-subcategories"><h2>Подкатегории</h2>'
+                f'<div class="mw-content-ltr"><ul>{subcategories}</ul></div></div>'
+            )
+        body = (
+            f'<html><body><div id="mw-content-text">{subcategories}'
+            f'<div id="mw-pages"><h2>Страницы в категории</h2>{navigation}'
+            '<div class="mw-content-ltr"><div class="mw-category">'
+            f'<div class="mw-category-group"><h3>А</h3><ul>{links}</ul></div>'
+            f'</div></div>{navigation}</div>'
+            '</div></body></html>'
+        )
+        return 'text/html; charset=utf-8', body
+
+
+class LocalWikiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    wiki = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        self.wiki.requests.append(self.path)
+        self.wiki.connections.add(self.client_address)
+        self.wiki.request_headers.append(dict(self.headers))
+        time.sleep(self.wiki.latency)
+
+        failure = self.wiki.failures_at.pop(len(self.wiki.requests), None)
+        if failure is None and self.wiki.failures:
+            failure = self.wiki.failures.pop(0)
+        if failure is not None:
+            status, headers = failure if isinstance(failure, tuple) else (failure, {})
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if url.path == '/w/api.php':
+            content_type, body = self.wiki.api(query)
+        elif url.path == '/w/index.php':
+            content_type, body = self.wiki.html(query['title'][0], query)
+        else:
+            content_type, body = self.wiki.html(unquote(url.path[len('/wiki/'):]), query)
+
+        payload = body.encode('utf-8')
+        etag = '"%s"' % hashlib.md5(payload).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.wiki.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('ETag', etag)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            payload = gzip.compress(payload)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_titles(count):
+    """Уникальные русские названия для тестовой категории"""
+    alphabet = 'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЭЮЯ'
+    return [f"{alphabet[i % len(alphabet)]}животное {i:05d}" for i in range(count)]
+
+
+def fast_session(**kwargs):
+    """Сессия с ограничителем, не замедляющим тесты"""
+    limiter = solution.RateLimiter(rate=1000, burst=1000, backoff=0)
+    return solution.create_session(backoff_factor=0, limiter=limiter, **kwargs)
+
+
 class TestAnimalsCounter(unittest.TestCase):
     """Тесты для функций подсчета животных"""
 
@@ -311,6 +503,706 @@ class TestIntegration(unittest.TestCase):
         self.assertEqual(total_counted, len(animals))
 
 
+@unittest.skipIf(solution is None, "requests/BeautifulSoup не установлены")
+class TestCrawlerModes(unittest.TestCase):
+    """Тесты режимов обхода категории на локальном сервере"""
+
+    category = "Категория:Животные по алфавиту"
+
+    def crawl(self, wiki, mode):
+        with redirect_stdout(io.StringIO()):
+            return solution.get_all_animals(
+                mode=mode, wiki_root=wiki.root, category=self.category,
+                session=fast_session(),
+            )
+
+    def test_api_mode(self):
+        """API-режим: страницы по 500 записей, продолжение по cmcontinue"""
+        titles = make_titles(1201)
+        with LocalWiki({self.category: titles}) as wiki:
+            result = self.crawl(wiki, 'api')
+
+        self.assertEqual(sorted(result), sorted(titles))
+        self.assertEqual(len(wiki.requests), 3)
+        self.assertTrue(all(path.startswith('/w/api.php') for path in wiki.requests))
+        self.assertIn('cmlimit=max', wiki.requests[0])
+
+    def test_html_mode(self):
+        """HTML-режим: страницы по 200 записей и переход по pagefrom"""
+        titles = make_titles(450)
+        with LocalWiki({self.category: titles}) as wiki:
+            result = self.crawl(wiki, 'html')
+
+        self.assertEqual(result, sorted(titles))
+        self.assertEqual(len(wiki.requests), 3)
+
+    def test_auto_mode_falls_back_to_html(self):
+        """При ошибке API используется разбор HTML"""
+        titles = make_titles(10)
+        with LocalWiki({self.category: titles}) as wiki:
+            wiki.api = lambda query: ('application/json', '{"error": {"info": "disabled"}}')
+            result = self.crawl(wiki, 'auto')
+
+        self.assertEqual(result, sorted(titles))
+        self.assertTrue(wiki.requests[0].startswith('/w/api.php'))
+        self.assertTrue(wiki.requests[1].startswith('/wiki/'))
+
+    def test_throttling_is_not_a_reason_to_fall_back(self):
+        """maxlag и 429 - временные сбои, а не отказ API"""
+        maxlag = solution.ApiError({'code': 'maxlag', 'info': 'Waiting for replica'})
+        self.assertFalse(solution.is_api_unavailable(maxlag))
+        self.assertTrue(solution.is_api_unavailable(solution.ApiError({'info': 'disabled'})))
+
+        response = solution.requests.Response()
+        response.status_code = 429
+        self.assertFalse(solution.is_api_unavailable(solution.requests.HTTPError(response=response)))
+        response.status_code = 403
+        self.assertTrue(solution.is_api_unavailable(solution.requests.HTTPError(response=response)))
+
+
+@unittest.skipIf(solution is None, "requests/BeautifulSoup не установлены")
+class TestCategoryPageParser(unittest.TestCase):
+    """Тесты однопроходного разбора страницы категории"""
+
+    fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'category_page.html')
+
+    def parse(self, chunk_size):
+        with open(self.fixture, encoding='utf-8') as file:
+            text = file.read()
+        chunks = (text[i:i + chunk_size] for i in range(0, len(text), chunk_size))
+        return solution.parse_category_page(chunks)
+
+    def test_reads_only_category_pages(self):
+        """Берутся только статьи из #mw-pages, без подкатегорий и меню"""
+        titles, next_href = self.parse(16 * 1024)
+
+        self.assertEqual(len(titles), 200)
+        self.assertFalse(any(title.startswith('Категория:') for title in titles))
+        self.assertIn('pagefrom=', next_href)
+        self.assertNotIn('&amp;', next_href)
+
+    def test_result_does_not_depend_on_chunking(self):
+        """Границы фрагментов могут резать теги и маркер блока"""
+        self.assertEqual(self.parse(7), self.parse(1 << 20))
+
+    def test_last_page_has_no_next_link(self):
+        """На последней странице есть только ссылка назад"""
+        html = (
+            '<div id="mw-pages">(<a href="/w/index.php?pageuntil=%D0%91" title="К">Предыдущая</a>)'
+            '<div class="mw-content-ltr"><ul><li><a href="/wiki/Б" title="Бобр">Бобр</a></li>'
+            '</ul></div></div><div><a href="/w/index.php?pagefrom=X" title="X">X</a></div>'
+        )
+        self.assertEqual(solution.parse_category_page([html]), (['Бобр'], None))
+
+
+@unittest.skipIf(solution is None, "requests/BeautifulSoup не установлены")
+class TestCrawlerSession(unittest.TestCase):
+    """Тесты общей HTTP-сессии"""
+
+    category = "Категория:Животные по алфавиту"
+
+    def test_session_reuses_connection(self):
+        """Все страницы обхода идут через одно keep-alive соединение со сжатием"""
+        titles = make_titles(1201)
+        session = solution.create_session(backoff_factor=0)
+        with LocalWiki({self.category: titles}) as wiki:
+            with redirect_stdout(io.StringIO()):
+                result = solution.get_all_animals(
+                    mode='api', wiki_root=wiki.root, category=self.category,
+                    session=session,
+                )
+
+        self.assertEqual(len(result), 1201)
+        self.assertEqual(len(wiki.requests), 3)
+        self.assertEqual(len(wiki.connections), 1)
+        headers = wiki.request_headers[0]
+        self.assertIn('gzip', headers['Accept-Encoding'])
+        self.assertTrue(headers['User-Agent'].startswith('beasts-counter/'))
+
+    def test_session_retries_server_errors(self):
+        """Ошибки 5xx повторяются с паузой, таймауты выставлены по умолчанию"""
+        session = solution.create_session(retries=2, backoff_factor=0, timeout=(1, 2))
+        self.assertEqual(session.timeout, (1, 2))
+
+        with LocalWiki({self.category: make_titles(3)}) as wiki:
+            wiki.failures = [503, 502]
+            with redirect_stdout(io.StringIO()):
+                result = solution.get_animals_from_page(
+                    f"{wiki.root}/wiki/{self.category}", session=session
+                )
+
+        self.assertEqual(len(result), 3)
+        self.assertEqual(len(wiki.requests), 3)
+
+
+@unittest.skipIf(solution is None, "requests/BeautifulSoup не установлены")
+class TestRateLimiter(unittest.TestCase):
+    """Тесты адаптивного ограничителя частоты"""
+
+    category = "Категория:Животные по алфавиту"
+
+    def test_token_bucket_spaces_requests(self):
+        """После всплеска burst запросы идут с шагом 1/rate"""
+        clock = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        with patch.object(solution.time, 'monotonic', lambda: clock[0]), \
+                patch.object(solution.time, 'sleep', sleep):
+            limiter = solution.RateLimiter(rate=2, burst=2)
+            waits = [limiter.acquire() for _ in range(4)]
+
+        self.assertEqual(waits, [0.0, 0.0, 0.5, 0.5])
+        self.assertEqual(limiter.stats()['waits'], 2)
+        self.assertAlmostEqual(limiter.stats()['total_wait'], 1.0)
+
+    def test_throttle_halves_rate_and_recovers(self):
+        """Отказ сервера вдвое снижает скорость, успехи её восстанавливают"""
+        limiter = solution.RateLimiter(rate=4, min_rate=1, increase=1, jitter=0)
+        self.assertEqual(limiter.throttled(retry_after=0), 0)
+        self.assertEqual(limiter.rate, 2)
+        limiter.throttled(retry_after=0)
+        limiter.throttled(retry_after=0)
+        self.assertEqual(limiter.rate, 1)
+
+        for _ in range(5):
+            limiter.succeeded()
+        self.assertEqual(limiter.rate, 4)
+        self.assertEqual(limiter.stats()['throttled'], 3)
+
+    def test_parse_retry_after(self):
+        """Retry-After в секундах и в виде HTTP-даты"""
+        self.assertEqual(solution.parse_retry_after('3'), 3.0)
+        self.assertEqual(solution.parse_retry_after('Thu, 01 Jan 1970 00:00:00 GMT'), 0.0)
+        self.assertIsNone(solution.parse_retry_after(None))
+        self.assertIsNone(solution.parse_retry_after('скоро'))
+
+    def test_session_backs_off_on_throttling(self):
+        """429 и отказ по maxlag повторяются через ограничитель"""
+        session = fast_session()
+        with LocalWiki({self.category: make_titles(3)}) as wiki:
+            wiki.failures = [
+                (429, {'Retry-After': '0'}),
+                (200, {'MediaWiki-API-Error': 'maxlag', 'Retry-After': '0'}),
+            ]
+            with redirect_stdout(io.StringIO()):
+                result = solution.get_all_animals(
+                    mode='api', wiki_root=wiki.root, category=self.category,
+                    session=session,
+                )
+
+        self.assertEqual(len(result), 3)
+        self.assertEqual(len(wiki.requests), 3)
+        self.assertIn('maxlag=5', wiki.requests[-1])
+        self.assertEqual(session.limiter.stats()['throttled'], 2)
+        self.assertLess(session.limiter.rate, 1000)
+
+
+@unittest.skipIf(solution is None, "requests/BeautifulSoup не установлены")
+class TestHttpCache(unittest.TestCase):
+    """Тесты постоянного HTTP-кэша с условными запросами"""
+
+    category = "Категория:Животные по алфавиту"
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite')
+
+    def crawl(self, wiki, mode, **cache_options):
+        cache = solution.HttpCache(self.path, **cache_options)
+        self.addCleanup(cache.close)
+        session = fast_session(cache=cache)
+        with redirect_stdout(io.StringIO()):
+            result = solution.get_all_animals(
+                mode=mode, wiki_root=wiki.root, category=self.category, session=session,
+            )
+        return result, cache.stats()
+
+    def test_default_session_has_no_cache(self):
+        """Общая сессия не создаёт файл кэша без явного включения"""
+        with patch.object(solution, '_session', None):
+            session = solution.get_session()
+        self.assertIsNone(session.cache)
+
+    def test_second_run_revalidates_pages(self):
+        """Повторный обход получает 304 и берёт тела из кэша"""
+        titles = make_titles(450)
+        for mode in ('api', 'html'):
+            with self.subTest(mode=mode):
+                with LocalWiki({self.category: titles}) as wiki:
+                    first, first_stats = self.crawl(wiki, mode)
+                    second, stats = self.crawl(wiki, mode)
+
+                self.assertEqual(second, first)
+                self.assertEqual(first_stats['hits'], 0)
+                self.assertEqual(stats['hits'], stats['lookups'])
+                self.assertEqual(wiki.not_modified, stats['hits'])
+                self.assertEqual(stats['hit_rate'], 1.0)
+                self.assertGreater(stats['bytes_saved'], 0)
+                os.remove(self.path)
+
+    def test_streamed_body_is_stored_after_reading(self):
+        """Потоковый ответ не буферизуется целиком, а сохраняется после дочитывания"""
+        cache = solution.HttpCache(self.path)
+        self.addCleanup(cache.close)
+        session = fast_session(cache=cache)
+        with LocalWiki({self.category: make_titles(450)}) as wiki:
+            url = f"{wiki.root}/wiki/{self.category}"
+            with session.get(url, stream=True) as response:
+                self.assertFalse(response._content_consumed)
+                next(response.iter_content(1024))
+            # Недочитанное тело не сохраняется
+            self.assertEqual(cache.stats()['stored'], 0)
+
+            with session.get(url, stream=True) as response:
+                self.assertFalse(response._content_consumed)
+                body = b''.join(response.iter_content(1024))
+            self.assertEqual(cache.stats()['stored'], 1)
+            self.assertEqual(cache.lookup(response.url)[0], body)
+
+            solution.fetch_category_page(url, session)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_expired_entries_are_refetched(self):
+        """Записи старше ttl не используются для условных запросов"""
+        with LocalWiki({self.category: make_titles(450)}) as wiki:
+            self.crawl(wiki, 'html')
+            _, stats = self.crawl(wiki, 'html', ttl=-1)
+
+        self.assertEqual(stats['hits'], 0)
+        self.assertEqual(wiki.not_modified, 0)
+
+    def test_eviction_bounds_cache_size(self):
+        """При превышении max_bytes вытесняются давно не использованные записи"""
+        with LocalWiki({self.category: make_titles(450)}) as wiki:
+            _, stats = self.crawl(wiki, 'html', max_bytes=30 * 1024)
+            _, second = self.crawl(wiki, 'html', max_bytes=30 * 1024)
+
+        self.assertEqual(stats['stored'], 3)
+        self.assertGreater(stats['evicted'], 0)
+        self.assertLess(second['hits'], 3)
+
+
+@unittest.skipIf(solution is None, "requests/BeautifulSoup не установлены")
+class TestCheckpoint(unittest.TestCase):
+    """Тесты очереди повторов и продолжения обхода с контрольной точки"""
+
+    category = "Категория:Животные по алфавиту"
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'crawl.json')
+
+    def crawl(self, wiki, mode='html', **kwargs):
+        with redirect_stdout(io.StringIO()):
+            return solution.get_all_animals(
+                mode=mode, wiki_root=wiki.root, category=self.category,
+                session=fast_session(retries=0), **kwargs
+            )
+
+    def test_failed_page_is_retried(self):
+        """Ошибка на странице не обрывает обход: диапазон повторяется с этой страницы"""
+        titles = make_titles(450)
+        for mode in ('api', 'html'):
+            with self.subTest(mode=mode):
+                with LocalWiki({self.category: titles}) as wiki:
+                    wiki.api_page_size = 200
+                    wiki.failures_at = {2: 500}
+                    result = self.crawl(wiki, mode)
+
+                self.assertEqual(result, sorted(titles))
+                self.assertEqual(len(wiki.requests), 4)
+                self.assertEqual(wiki.requests[1], wiki.requests[2])
+
+    def test_resume_from_checkpoint(self):
+        """Повторный запуск продолжает с последней полученной страницы"""
+        titles = make_titles(650)
+        with LocalWiki({self.category: titles}) as wiki:
+            wiki.failures_at = {3: 500}
+            partial = self.crawl(wiki, checkpoint=self.path, max_attempts=1)
+
+            self.assertEqual(partial, sorted(titles)[:400])
+            with open(self.path, encoding='utf-8') as file:
+                state = json.load(file)
+            self.assertIn('pagefrom=', state['progress']['0']['cursor'])
+            self.assertEqual(len(state['visited']), 2)
+            self.assertEqual(sum(state['counts'].values()), 400)
+
+            # Запись, не попавшая в контрольную точку, отбрасывается
+            with open(self.path + '.titles', 'a', encoding='utf-8') as file:
+                file.write('0\tНедописанная запись\n')
+
+            wiki.requests.clear()
+            result = self.crawl(wiki, checkpoint=self.path)
+
+        self.assertEqual(result, sorted(titles))
+        self.assertEqual(len(wiki.requests), 2)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + '.titles'))
+
+    def test_checkpoint_of_other_category_is_rejected(self):
+        """Контрольная точка другой категории не используется"""
+        with LocalWiki({self.category: make_titles(450), 'Другая': make_titles(5)}) as wiki:
+            wiki.failures_at = {2: 500}
+            self.crawl(wiki, checkpoint=self.path, max_attempts=1)
+            with self.assertRaises(ValueError):
+                with redirect_stdout(io.StringIO()):
+                    solution.get_all_animals(
+                        mode='html', wiki_root=wiki.root, category='Другая',
+                        session=fast_session(), checkpoint=self.path,
+                    )
+
+
+@unittest.skipIf(solution is None, "requests/BeautifulSoup не установлены")
+class TestCountingPipeline(unittest.TestCase):
+    """Тесты потокового подсчёта без списка названий"""
+
+    category = "Категория:Животные по алфавиту"
+
+    @staticmethod
+    def pages(count, page_size=200):
+        """Страницы с названиями, создаваемые по мере чтения"""
+        alphabet = 'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЭЮЯ'
+        title = lambda i: f"{alphabet[i % len(alphabet)]}животное {i:05d}"
+        for start in range(0, count, page_size):
+            # Каждая страница повторяет последнее название предыдущей
+            yield [title(i) for i in range(max(start - 1, 0), min(start + page_size, count))]
+
+    def test_counts_match_list_counting(self):
+        """Повторы на стыках страниц не учитываются"""
+        expected = count_animals_by_letter(make_titles(1000))
+        for seen in (None, solution.TitleHashSet(), solution.BloomFilter(10000, 0.0001)):
+            with self.subTest(seen=type(seen).__name__):
+                self.assertEqual(solution.count_unique_titles(self.pages(1000), seen), expected)
+
+    def test_bloom_filter_error_rate(self):
+        """Доля ложных срабатываний близка к заданной"""
+        bloom = solution.BloomFilter(capacity=5000, error_rate=0.01)
+        for i in range(5000):
+            bloom.add(f"животное {i}")
+        self.assertFalse(bloom.add("животное 0"))
+        self.assertIn("животное 4999", bloom)
+        false_positives = sum(f"зверь {i}" in bloom for i in range(5000))
+        self.assertLess(false_positives, 5000 * 0.03)
+
+    def test_bloom_filter_memory_is_flat(self):
+        """С фильтром Блума пик памяти не растёт с числом названий"""
+        def peak(count):
+            bloom = solution.BloomFilter(capacity=100000)
+            tracemalloc.start()
+            try:
+                solution.count_unique_titles(self.pages(count), bloom)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        small, large = peak(2000), peak(20000)
+        self.assertLess(large - small, 64 * 1024)
+
+    def test_count_all_animals(self):
+        """Параллельный обход считает по буквам без повторов на стыках диапазонов"""
+        titles = make_titles(1500) + ['Zoo']
+        with LocalWiki({self.category: titles}) as wiki:
+            with redirect_stdout(io.StringIO()):
+                counts = solution.count_all_animals(
+                    mode='api', wiki_root=wiki.root, category=self.category,
+                    session=fast_session(), workers=4, seen=solution.BloomFilter(10000),
+                )
+
+        self.assertEqual(counts, count_animals_by_letter(titles))
+
+
+@unittest.skipIf(solution is None, "requests/BeautifulSoup не установлены")
+class TestMultiCategoryCrawl(unittest.TestCase):
+    """Тесты обхода нескольких категорий и деревьев подкатегорий"""
+
+    root = "Категория:Животные"
+    tree = {
+        "Категория:Животные": ["Категория:Птицы", "Категория:Звери"],
+        "Категория:Птицы": ["Категория:Совы", "Категория:Животные"],
+        "Категория:Звери": ["Категория:Совы"],
+    }
+
+    def make_wiki(self, size=250):
+        names = [self.root, "Категория:Птицы", "Категория:Звери", "Категория:Совы"]
+        categories = {
+            name: [f"{title} ({name[10:]})" for title in make_titles(size + i)]
+            for i, name in enumerate(names)
+        }
+        return LocalWiki(categories, self.tree), categories
+
+    def crawl(self, wiki, categories, **kwargs):
+        with redirect_stdout(io.StringIO()):
+            return solution.crawl_categories(
+                categories, wiki_root=wiki.root, session=fast_session(), **kwargs
+            )
+
+    def test_subcategory_tree_with_cycle(self):
+        """Дерево обходится в ширину, цикл не приводит к повторному обходу"""
+        for mode in ('api', 'html'):
+            with self.subTest(mode=mode):
+                wiki, categories = self.make_wiki()
+                with wiki:
+                    states = self.crawl(wiki, [self.root], mode=mode)
+
+                self.assertEqual(list(states)[0], self.root)
+                self.assertEqual(set(states), set(categories))
+                for name, state in states.items():
+                    self.assertEqual(dict(state.counts), count_animals_by_letter(categories[name]))
+
+    def test_max_depth_and_multiple_roots(self):
+        """max_depth ограничивает глубину, пересекающиеся корни обходятся один раз"""
+        wiki, _ = self.make_wiki()
+        with wiki:
+            states = self.crawl(wiki, [self.root, "Категория:Звери"], max_depth=0)
+            nested = self.crawl(wiki, [self.root], max_depth=1, parts=3)
+
+        self.assertEqual(list(states), [self.root, "Категория:Звери"])
+        self.assertEqual(set(nested), {self.root, "Категория:Птицы", "Категория:Звери"})
+        self.assertEqual(nested[self.root].total, 250)
+
+    def test_save_categories_to_csv(self):
+        """Каждая категория сохраняется в свой файл в формате beasts.csv"""
+        wiki, categories = self.make_wiki(size=10)
+        with wiki, tempfile.TemporaryDirectory() as directory:
+            states = self.crawl(wiki, [self.root])
+            with redirect_stdout(io.StringIO()):
+                paths = solution.save_categories_to_csv(states, directory)
+
+            self.assertEqual(os.path.basename(paths["Категория:Совы"]), "Совы.csv")
+            with open(paths["Категория:Совы"], encoding='utf-8') as file:
+                rows = dict(csv.reader(file))
+        expected = count_animals_by_letter(categories["Категория:Совы"])
+        self.assertEqual({letter: int(count) for letter, count in rows.items()}, expected)
+
+    def test_categories_are_crawled_concurrently(self):
+        """Время обхода многих категорий близко ко времени самой длинной"""
+        names = [f"Категория:Вид {i}" for i in range(8)]
+        with LocalWiki({name: make_titles(450) for name in names}) as wiki:
+            wiki.latency = 0.05
+            started = time.perf_counter()
+            states = self.crawl(wiki, names, mode='html', recursive=False, workers=8)
+            elapsed = time.perf_counter() - started
+
+        self.assertTrue(all(state.total == 450 for state in states.values()))
+        # По отдельности: 8 категорий * 3 страницы * 0.05 с = 1.2 с
+        self.assertLess(elapsed, 0.6)
+
+
+@unittest.skipIf(solution is None, "requests/BeautifulSoup не установлены")
+class TestCrawlMetrics(unittest.TestCase):
+    """Тесты метрик обхода в формате JSON lines"""
+
+    category = "Категория:Животные по алфавиту"
+
+    def crawl(self, wiki, mode, metrics, **session_options):
+        session = fast_session(metrics=metrics, **session_options)
+        solution.get_all_animals(
+            mode=mode, wiki_root=wiki.root, category=self.category, session=session,
+        )
+        return session
+
+    @staticmethod
+    def events(stream, event):
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        return [record for record in records if record['event'] == event]
+
+    def test_page_metrics(self):
+        """Для каждой страницы пишутся этапы, байты и число названий"""
+        for mode in ('api', 'html'):
+            with self.subTest(mode=mode):
+                stream = io.StringIO()
+                with LocalWiki({self.category: make_titles(1201)}) as wiki:
+                    wiki.api_page_size = 450
+                    wiki.html_page_size = 450
+                    self.crawl(wiki, mode, solution.CrawlMetrics(stream))
+
+                pages = self.events(stream, 'page')
+                self.assertEqual(len(pages), 3)
+                self.assertEqual(sum(page['titles'] for page in pages), 1201)
+                self.assertTrue(all(page['kind'] == mode and page['bytes'] > 0 for page in pages))
+                for stage in ('ttfb', 'download', 'parse'):
+                    self.assertTrue(all(page[stage] >= 0 for page in pages))
+                # Соединение устанавливается один раз и дальше переиспользуется
+                self.assertIn('dns', pages[0])
+                self.assertIn('connect', pages[0])
+                self.assertNotIn('connect', pages[1])
+
+    def test_plain_session(self):
+        """Обычная requests.Session без метрик по-прежнему подходит для обхода"""
+        for mode in ('api', 'html'):
+            with self.subTest(mode=mode):
+                session = solution.requests.Session()
+                self.addCleanup(session.close)
+                with LocalWiki({self.category: make_titles(450)}) as wiki:
+                    result = solution.get_all_animals(
+                        mode=mode, wiki_root=wiki.root, category=self.category, session=session,
+                    )
+                self.assertEqual(len(result), 450)
+
+    def test_retries_and_summary(self):
+        """Повторы учитываются в странице и в сводке, сводка содержит перцентили"""
+        stream = io.StringIO()
+        metrics = solution.CrawlMetrics(stream)
+        with LocalWiki({self.category: make_titles(450)}) as wiki:
+            wiki.failures_at = {2: 502}
+            session = self.crawl(wiki, 'html', metrics, retries=1)
+        summary = solution.emit_run_summary(session)
+
+        self.assertEqual([page['retries'] for page in self.events(stream, 'page')], [0, 1, 0])
+        self.assertEqual(summary['pages'], 3)
+        self.assertEqual(summary['counters']['titles'], 450)
+        self.assertEqual(summary['counters']['retries'], 1)
+        self.assertGreater(summary['titles_per_s'], 0)
+        self.assertLessEqual(summary['stages']['parse']['p50'], summary['stages']['parse']['p95'])
+        self.assertIn('limiter', summary)
+        self.assertEqual(self.events(stream, 'summary')[0]['pages'], 3)
+
+    def test_profile_hook(self):
+        """С profile=True функции разбора выполняются под cProfile"""
+        metrics = solution.CrawlMetrics(profile=True)
+        with LocalWiki({self.category: make_titles(450)}) as wiki:
+            self.crawl(wiki, 'html', metrics)
+
+        stats = metrics.profile_stats()
+        names = {function for _, _, function in stats.stats}
+        self.assertIn('parse_category_page', names)
+        self.assertIsNone(solution.CrawlMetrics().profile_stats())
+
+    def test_percentile(self):
+        """Перцентиль по ближайшему рангу"""
+        values = list(range(1, 101))
+        self.assertEqual(solution.percentile(values, 0.5), 50)
+        self.assertEqual(solution.percentile(values, 0.95), 95)
+        self.assertIsNone(solution.percentile([], 0.5))
+
+
+CATEGORYLINKS_DUMP = r"""-- MySQL dump 10.19
+/*!40101 SET NAMES binary*/;
+DROP TABLE IF EXISTS `categorylinks`;
+CREATE TABLE `categorylinks` (
+  `cl_from` int(8) unsigned NOT NULL DEFAULT 0,
+  `cl_to` varbinary(255) NOT NULL DEFAULT '',
+  `cl_sortkey` varbinary(230) NOT NULL DEFAULT '',
+  `cl_timestamp` timestamp NOT NULL DEFAULT current_timestamp(),
+  `cl_sortkey_prefix` varbinary(255) NOT NULL DEFAULT '',
+  `cl_collation` varbinary(32) NOT NULL DEFAULT '',
+  `cl_type` enum('page','subcat','file') NOT NULL DEFAULT 'page',
+  PRIMARY KEY (`cl_from`,`cl_to`)
+) ENGINE=InnoDB DEFAULT CHARSET=binary;
+INSERT INTO `categorylinks` VALUES (1,'Животные_по_алфавиту','АИСТ','2020-01-01 00:00:00','','uca-ru','page'),(2,'Млекопитающие','БАРСУК','2020-01-01 00:00:00','','uca-ru','page'),(3,'Животные_по_алфавиту','ВОЛК (ЗВЕРЬ), СЕРЫЙ','2020-01-01 00:00:00','','uca-ru','page');
+INSERT INTO `categorylinks` VALUES (4,'Животные_по_алфавиту','ЖИВОТНЫЕ НА БУКВУ А','2020-01-01 00:00:00','','uca-ru','subcat'),(5,'Животные_по_алфавиту','Д\'АРТАНЬЯНОВ ЖУК','2020-01-01 00:00:00','','uca-ru','page'),(6,'Животные_по_алфавиту','ZEBRA','2020-01-01 00:00:00','','uca-ru','page'),(7,'Животные_по_алфавиту_(архив)','ЁЖ','2020-01-01 00:00:00','','uca-ru','page'),(8,'Животные_по_алфавиту','ЁЖ','2020-01-01 00:00:00','','uca-ru','page');
+"""
+
+PAGE_DUMP = r"""CREATE TABLE `page` (
+  `page_id` int(8) unsigned NOT NULL AUTO_INCREMENT,
+  `page_namespace` int(11) NOT NULL DEFAULT 0,
+  `page_title` varbinary(255) NOT NULL DEFAULT '',
+  `page_is_redirect` tinyint(1) unsigned NOT NULL DEFAULT 0,
+  `page_len` int(8) unsigned NOT NULL DEFAULT 0,
+  `page_content_model` varbinary(32) DEFAULT NULL,
+  PRIMARY KEY (`page_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=binary;
+INSERT INTO `page` VALUES (1,0,'Аист',0,100,'wikitext'),(2,0,'Барсук',0,100,NULL),(3,0,'Волк_(зверь),_серый',0,100,'wikitext'),(4,14,'Животные_на_букву_А',0,10,'wikitext');
+INSERT INTO `page` VALUES (5,0,'Д\'артаньянов_жук',0,100,'wikitext'),(6,0,'Zebra',0,100,'wikitext'),(7,0,'Ёжик_из_архива',0,100,'wikitext'),(8,0,'Ёж',0,100,'wikitext');
+"""
+
+
+@unittest.skipIf(solution is None, "requests/BeautifulSoup не установлены")
+class TestOfflineDumps(unittest.TestCase):
+    """Тесты подсчёта по SQL-дампам categorylinks и page"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.categorylinks = os.path.join(directory.name, 'ruwiki-latest-categorylinks.sql.gz')
+        self.page = os.path.join(directory.name, 'ruwiki-latest-page.sql.gz')
+        for path, content in ((self.categorylinks, CATEGORYLINKS_DUMP), (self.page, PAGE_DUMP)):
+            with gzip.open(path, 'wt', encoding='utf-8') as file:
+                file.write(content)
+
+    def test_parse_sql_values(self):
+        """Кавычки, скобки, запятые и экранирование внутри строк"""
+        values = solution.parse_sql_values(r"7,'Волк_(зверь),_серый',NULL,'Д\'Артаньян\\',-1.5")
+        self.assertEqual(values, ['7', "Волк_(зверь),_серый", None, "Д'Артаньян\\", '-1.5'])
+
+    def test_category_member_ids(self):
+        """Берутся только статьи (не подкатегории) именно этой категории"""
+        ids = solution.category_member_ids(self.categorylinks)
+        self.assertEqual(ids, {1, 3, 5, 6, 8})
+
+    def test_count_animals_from_dumps(self):
+        """Названия из дампа page идут в обычный подсчёт по буквам"""
+        with redirect_stdout(io.StringIO()):
+            counts = solution.count_animals_from_dumps(self.categorylinks, self.page)
+        self.assertEqual(counts, {'А': 1, 'В': 1, 'Д': 1, 'Ё': 1})
+
+
+@unittest.skipIf(solution is None, "requests/BeautifulSoup не установлены")
+class TestParallelCrawl(unittest.TestCase):
+    """Тесты параллельного обхода по диапазонам алфавита"""
+
+    category = "Категория:Животные по алфавиту"
+
+    def test_alphabet_ranges_cover_category(self):
+        """Диапазоны идут подряд и покрывают всю категорию"""
+        ranges = solution.alphabet_ranges(4)
+        self.assertEqual(len(ranges), 4)
+        self.assertIsNone(ranges[0][0])
+        self.assertIsNone(ranges[-1][1])
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+        self.assertEqual(len(solution.alphabet_ranges(100)), len(solution.RANGE_LETTERS))
+
+    def test_parallel_modes_match_sequential(self):
+        """Параллельный обход даёт те же записи без повторов"""
+        titles = make_titles(1500) + ['Zoo', '1 животное']
+        for mode in ('api', 'html'):
+            with self.subTest(mode=mode):
+                with LocalWiki({self.category: titles}) as wiki:
+                    with redirect_stdout(io.StringIO()):
+                        result = solution.get_all_animals(
+                            mode=mode, wiki_root=wiki.root, category=self.category,
+                            session=fast_session(), workers=4,
+                        )
+
+                self.assertEqual(sorted(result), sorted(titles))
+                self.assertEqual(len(result), len(set(result)))
+                self.assertGreaterEqual(len(wiki.connections), 2)
+
+    def test_ranges_follow_sort_keys(self):
+        """Границы диапазонов в HTML сравниваются с ключами сортировки, а не с названиями"""
+        alphabet = 'АБВГДЕ'
+        sortkeys = {
+            f"Обыкновенный зверь {i:03d}": f"{alphabet[i % len(alphabet)]}ЗВЕРЬ {i:03d}"
+            for i in range(60)
+        }
+        titles = list(sortkeys) + ['Ёж']
+        with LocalWiki({self.category: titles}, sortkeys=sortkeys) as wiki:
+            wiki.html_page_size = 4
+            with redirect_stdout(io.StringIO()):
+                state = solution.crawl(
+                    mode='html', wiki_root=wiki.root, category=self.category,
+                    session=fast_session(), workers=2, parts=4,
+                )
+
+        self.assertEqual(state.pending(), [])
+        self.assertEqual(sorted(state.result()), sorted(titles))
+
+    def test_main_category_uses_workers(self):
+        """--workers доходит до обхода основной категории"""
+        state = Mock(total=0)
+        with patch.object(solution, 'crawl', return_value=state) as crawl:
+            with redirect_stdout(io.StringIO()):
+                solution.count_main_category(workers=3)
+        self.assertEqual(crawl.call_args.kwargs['workers'], 3)
+
+
 if __name__ == '__main__':
     # Запуск тестов с подробным выводом
     unittest.main(verbosity=2)
\ No newline at end of file
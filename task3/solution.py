@@ -1,66 +1,707 @@
+import argparse
+import csv
+import gzip
+import heapq
+import json
+import os
+import sys
+import time
+from array import array
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# numpy импортируется внутри функций, которым он нужен, чтобы модуль,
+# движок python и разбор журналов событий работали и без него
+
+
+def timestamps_to_intervals(timestamps):
+    """Преобразует список временных меток в список интервалов (start, end)"""
+    return list(zip(timestamps[0::2], timestamps[1::2]))
+
+
+def merge_intervals(intervals):
+    """Сортирует интервалы и склеивает пересекающиеся и смежные
+
+    Пустые интервалы (start >= end) отбрасываются. Повторные заходы
+    участника могут перекрываться, после склейки каждая секунда
+    присутствия учитывается один раз.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def intersect_intervals(intervals1, intervals2):
+    """Пересекает два отсортированных склеенных списка интервалов двумя указателями"""
+    intersections = []
+    i = j = 0
+    while i < len(intervals1) and j < len(intervals2):
+        start1, end1 = intervals1[i]
+        start2, end2 = intervals2[j]
+
+        start = max(start1, start2)
+        end = min(end1, end2)
+        if start < end:
+            intersections.append((start, end))
+
+        # Сдвигаем тот интервал, который заканчивается раньше
+        if end1 < end2:
+            i += 1
+        else:
+            j += 1
+    return intersections
+
+
 def appearance(intervals):
     """Возвращает время общего присутствия ученика и учителя на уроке"""
-    
-    def timestamps_to_intervals(timestamps):
-        """Преобразует список временных меток в список интервалов (start, end)"""
-        intervals = []
-        for i in range(0, len(timestamps), 2):
-            intervals.append((timestamps[i], timestamps[i + 1]))
-        return intervals
-    
-    def intersect_intervals(interval1, interval2):
-        """Находит пересечение двух интервалов"""
-        start = max(interval1[0], interval2[0])
-        end = min(interval1[1], interval2[1])
-        
-        if start < end:
-            return (start, end)
-        return None
-    
-    def intersect_all_intervals(intervals_list1, intervals_list2):
-        """Находит все пересечения между двумя списками интервалов"""
-        intersections = []
-        
-        for interval1 in intervals_list1:
-            for interval2 in intervals_list2:
-                intersection = intersect_intervals(interval1, interval2)
-                if intersection:
-                    intersections.append(intersection)
-        
-        return intersections
-    
-    # Получаем интервалы урока (всегда один)
-    lesson_intervals = timestamps_to_intervals(intervals['lesson'])
-    
-    # Получаем интервалы ученика и учителя
-    pupil_intervals = timestamps_to_intervals(intervals['pupil'])
-    tutor_intervals = timestamps_to_intervals(intervals['tutor'])
-    
-    # Находим пересечения ученика с уроком
-    pupil_lesson_intersections = intersect_all_intervals(pupil_intervals, lesson_intervals)
-    
-    # Находим пересечения учителя с уроком
-    tutor_lesson_intersections = intersect_all_intervals(tutor_intervals, lesson_intervals)
-    
-    # Находим пересечения всех троих (ученик+учитель+урок)
-    final_intersections = intersect_all_intervals(pupil_lesson_intersections, tutor_lesson_intersections)
-    
+    # Интервалы каждого участника сортируются и склеиваются один раз,
+    # дальше пересечения считаются за линейное время
+    lesson_intervals = merge_intervals(timestamps_to_intervals(intervals['lesson']))
+    pupil_intervals = merge_intervals(timestamps_to_intervals(intervals['pupil']))
+    tutor_intervals = merge_intervals(timestamps_to_intervals(intervals['tutor']))
+
+    # Находим пересечения всех троих (урок+ученик+учитель)
+    final_intersections = intersect_intervals(
+        intersect_intervals(lesson_intervals, pupil_intervals), tutor_intervals
+    )
+
     # Суммируем длительности всех пересечений
     total_time = 0
     for start, end in final_intersections:
         total_time += end - start
-    
+
     return total_time
 
 
-# Пример использования:
+# Результат разбора группового урока: at_least[k] - секунды урока, когда
+# присутствовали учитель и не меньше k учеников; overlap - секунды, которые
+# каждый ученик провёл на уроке вместе с учителем
+GroupPresence = namedtuple('GroupPresence', ('at_least', 'overlap'))
+
+
+def iter_presence_events(participant, timestamps):
+    """События входа (+1) и выхода (-1) участника по склеенным интервалам, по возрастанию времени"""
+    for start, end in merge_intervals(timestamps_to_intervals(timestamps)):
+        yield start, 1, participant
+        yield end, -1, participant
+
+
+def group_presence(intervals):
+    """Присутствие на групповом уроке за один проход по событиям всех участников
+
+    intervals - словарь {'lesson': [...], 'tutor': [...], 'pupils': {id: [...]}},
+    pupils может быть и списком, тогда идентификаторы - номера в нём.
+
+    События каждого участника уже отсортированы, поэтому общий поток
+    собирается слиянием через кучу за O(E log n). Между соседними событиями
+    известно, идёт ли урок, есть ли учитель и сколько учеников на месте:
+    промежуток добавляется к счётчику для этого числа учеников. Время
+    урока с учителем копится нарастающим итогом, и ученику при выходе
+    засчитывается прирост итога с момента его входа.
+    """
+    pupils = intervals['pupils']
+    if not isinstance(pupils, dict):
+        pupils = dict(enumerate(pupils))
+    pupil_ids = list(pupils)
+
+    # Участник 0 - урок, 1 - учитель, 2 и дальше - ученики
+    streams = [
+        iter_presence_events(0, intervals['lesson']),
+        iter_presence_events(1, intervals['tutor']),
+    ]
+    streams += [iter_presence_events(i + 2, pupils[pupil_id]) for i, pupil_id in enumerate(pupil_ids)]
+
+    exact = [0] * (len(pupil_ids) + 1)
+    overlap = [0] * len(pupil_ids)
+    entered = {}
+    lesson_open = tutor_open = False
+    present = 0
+    joint = 0
+    previous = None
+    for timestamp, delta, participant in heapq.merge(*streams):
+        if lesson_open and tutor_open and timestamp > previous:
+            exact[present] += timestamp - previous
+            joint += timestamp - previous
+        previous = timestamp
+
+        if participant == 0:
+            lesson_open = delta > 0
+        elif participant == 1:
+            tutor_open = delta > 0
+        elif delta > 0:
+            present += 1
+            entered[participant] = joint
+        else:
+            present -= 1
+            overlap[participant - 2] += joint - entered.pop(participant)
+
+    at_least = []
+    total = 0
+    for seconds in reversed(exact):
+        total += seconds
+        at_least.append(total)
+    at_least.reverse()
+    return GroupPresence(at_least, dict(zip(pupil_ids, overlap)))
+
+
+def appearance_at_least(intervals, k):
+    """Секунды урока, когда присутствовали учитель и не меньше k учеников"""
+    at_least = group_presence(intervals).at_least
+    return at_least[k] if k < len(at_least) else 0
+
+
+def pupil_overlaps(intervals):
+    """Секунды, которые каждый ученик провёл на уроке вместе с учителем"""
+    return group_presence(intervals).overlap
+
+
+def pack_lessons(lessons):
+    """Упаковывает список словарей с интервалами в плоские массивы для appearance_many
+
+    Для каждой роли возвращается пара (timestamps, offsets): все метки
+    подряд в int64 и смещения начала меток каждого урока, offsets[i]:offsets[i + 1]
+    """
+    import numpy as np
+
+    packed = []
+    for role in ('lesson', 'pupil', 'tutor'):
+        lengths = [len(intervals[role]) for intervals in lessons]
+        offsets = np.zeros(len(lessons) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        timestamps = np.fromiter(
+            (t for intervals in lessons for t in intervals[role]), dtype=np.int64, count=offsets[-1]
+        )
+        packed += [timestamps, offsets]
+    return tuple(packed)
+
+
+def appearance_many(lesson, lesson_offsets, pupil, pupil_offsets, tutor, tutor_offsets):
+    """Время общего присутствия ученика и учителя для пачки уроков
+
+    Каждая роль задаётся плоским массивом меток и смещениями уроков, как
+    возвращает pack_lessons. Результат совпадает с appearance для каждого
+    урока и возвращается массивом int64.
+
+    Все интервалы превращаются в события входа (+1) и выхода (-1) своей роли
+    и сортируются один раз по (урок, время). Накопленная сумма событий роли
+    даёт число её открытых интервалов: внутри урока сумма событий равна нулю,
+    поэтому счётчики сами обнуляются на границе уроков, а перекрывающиеся
+    заходы не учитываются дважды. Промежуток между соседними событиями
+    одного урока засчитывается, если открыты все три роли.
+    """
+    import numpy as np
+
+    count = len(lesson_offsets) - 1
+    roles = []
+    for timestamps, offsets in (
+        (lesson, lesson_offsets), (pupil, pupil_offsets), (tutor, tutor_offsets)
+    ):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if len(offsets) != count + 1:
+            raise ValueError('Смещения всех ролей должны описывать одно число уроков')
+        # Номер урока для каждого интервала
+        segments = np.repeat(np.arange(count, dtype=np.int64), np.diff(offsets) // 2)
+        roles.append((timestamps[0::2], timestamps[1::2], segments))
+
+    # Границы каждого урока: присутствие за ними не учитывается, поэтому
+    # интервалы всех ролей сразу обрезаются по ним
+    lesson_starts, lesson_ends, lesson_segments = roles[0]
+    low = np.full(count, np.iinfo(np.int64).max, dtype=np.int64)
+    high = np.full(count, np.iinfo(np.int64).min, dtype=np.int64)
+    np.minimum.at(low, lesson_segments, lesson_starts)
+    np.maximum.at(high, lesson_segments, lesson_ends)
+
+    times = []
+    segments = []
+    deltas = []
+    for index, (starts, ends, segment) in enumerate(roles):
+        starts = np.maximum(starts, low[segment])
+        ends = np.minimum(ends, high[segment])
+        # Пустые интервалы не дают присутствия, как и в merge_intervals
+        keep = starts < ends
+        size = np.count_nonzero(keep)
+        times += [starts[keep], ends[keep]]
+        segments += [segment[keep], segment[keep]]
+        # Вход и выход роли index кодируются как +1 и -1 в её разряде
+        delta = np.zeros((2 * size, len(roles)), dtype=np.int64)
+        delta[:size, index] = 1
+        delta[size:, index] = -1
+        deltas.append(delta)
+
+    times = np.concatenate(times)
+    segments = np.concatenate(segments)
+    deltas = np.concatenate(deltas)
+
+    # Сортировка по (урок, время): если уроки короткие, оба ключа
+    # укладываются в одно int64 и хватает одного argsort
+    offset_times = times - low[segments]
+    span = int(offset_times.max()) + 1 if len(times) else 1
+    if count * span < np.iinfo(np.int64).max:
+        order = np.argsort(segments * span + offset_times)
+    else:
+        order = np.lexsort((times, segments))
+    times = times[order]
+    segments = segments[order]
+
+    # Число открытых интервалов каждой роли после каждого события
+    present = (np.cumsum(deltas[order], axis=0) > 0).all(axis=1)
+
+    # Вклад события k: промежуток до следующего события того же урока
+    gaps = np.zeros(len(times), dtype=np.int64)
+    gaps[:-1] = np.diff(times)
+    gaps[:-1][~present[:-1] | (segments[1:] != segments[:-1])] = 0
+
+    totals = np.zeros(len(times) + 1, dtype=np.int64)
+    np.cumsum(gaps, out=totals[1:])
+    bounds = np.searchsorted(segments, np.arange(count + 1, dtype=np.int64))
+    return totals[bounds[1:]] - totals[bounds[:-1]]
+
+
+ROLES = ('lesson', 'pupil', 'tutor')
+LOG_FIELDS = ('lesson_id', 'user_id', 'role', 'event', 'timestamp')
+
+# Одна запись журнала: вход (enter) или выход (leave) участника урока.
+# Начало и конец самого урока записываются как enter/leave роли lesson
+Event = namedtuple('Event', LOG_FIELDS)
+
+
+def open_log(path):
+    """Открывает журнал (.gz или обычный файл) как текст с потоковой распаковкой"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def log_format(path):
+    """Формат журнала по расширению файла: csv или jsonl"""
+    name = path[:-3] if path.endswith('.gz') else path
+    extension = os.path.splitext(name)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f'Неизвестный формат журнала: {path}')
+
+
+def iter_events(file, format='csv'):
+    """Потоково читает события из журнала CSV (с заголовком) или JSONL
+
+    Файл читается построчно, в памяти держится только текущая запись.
+    """
+    if format == 'csv':
+        reader = csv.reader(file)
+        header = next(reader, None) or []
+        missing = [field for field in LOG_FIELDS if field not in header]
+        if missing:
+            raise ValueError(f'В заголовке журнала нет полей: {", ".join(missing)}')
+        columns = [header.index(field) for field in LOG_FIELDS]
+        rows = ([row[column] for column in columns] for row in reader if row)
+    elif format == 'jsonl':
+        records = (json.loads(line) for line in file if line.strip())
+        rows = ([record.get(field) for field in LOG_FIELDS] for record in records)
+    else:
+        raise ValueError(f'Неизвестный формат журнала: {format}')
+
+    for lesson_id, user_id, role, event, timestamp in rows:
+        if role not in ROLES:
+            raise ValueError(f'Неизвестная роль: {role}')
+        if event not in ('enter', 'leave'):
+            raise ValueError(f'Неизвестное событие: {event}')
+        yield Event(str(lesson_id), str(user_id or ''), role, event, int(timestamp))
+
+
+class LessonLog:
+    """Собирает интервалы присутствия одного урока из его событий
+
+    Входы и выходы участника считаются как вложенные подключения: участник
+    присутствует, пока у него открыто хотя бы одно (например, две вкладки).
+    Выход без входа пропускается, а незакрытое присутствие обрезается
+    концом урока.
+    """
+
+    def __init__(self, lesson_id):
+        self.lesson_id = lesson_id
+        self.intervals = {role: {} for role in ROLES}
+        # (role, user_id) -> [число открытых подключений, время первого входа]
+        self.open = {}
+        self.last_timestamp = None
+        self.started = False
+
+    def add(self, event):
+        """Учитывает одно событие урока"""
+        if self.last_timestamp is None or event.timestamp > self.last_timestamp:
+            self.last_timestamp = event.timestamp
+        # У урока один «участник», кто бы ни был записан в user_id
+        user_id = '' if event.role == 'lesson' else event.user_id
+        key = (event.role, user_id)
+        state = self.open.get(key)
+
+        if event.event == 'enter':
+            if event.role == 'lesson':
+                self.started = True
+            if state is None:
+                self.open[key] = [1, event.timestamp]
+            else:
+                state[0] += 1
+        elif state is not None:
+            state[0] -= 1
+            if state[0] == 0:
+                del self.open[key]
+                self._close(event.role, user_id, state[1], event.timestamp)
+
+    @property
+    def finished(self):
+        """Урок начался и закончился: его события до конца урока уже известны"""
+        return self.started and ('lesson', '') not in self.open
+
+    def _close(self, role, user_id, start, end):
+        self.intervals[role].setdefault(user_id, []).extend((start, end))
+
+    def user_intervals(self):
+        """Интервалы каждого участника: {role: {user_id: [вход, выход, ...]}}
+
+        Незакрытые подключения обрезаются концом урока. Если конец урока
+        не записан, им считается последнее событие урока.
+        """
+        state = self.open.pop(('lesson', ''), None)
+        if state is not None:
+            self._close('lesson', '', state[1], self.last_timestamp)
+        lesson = self.intervals['lesson'].get('', [])
+        lesson_end = max(lesson[1::2], default=self.last_timestamp)
+
+        for (role, user_id), (_, start) in self.open.items():
+            self._close(role, user_id, start, max(start, lesson_end))
+        self.open.clear()
+        return self.intervals
+
+    def to_group_intervals(self):
+        """Словарь для group_presence: учителя вместе, ученики по отдельности"""
+        users = self.user_intervals()
+        return {
+            'lesson': users['lesson'].get('', []),
+            'tutor': [t for timestamps in users['tutor'].values() for t in timestamps],
+            'pupils': dict(users['pupil']),
+        }
+
+    def to_intervals(self):
+        """Словарь для appearance: интервалы всех участников роли подряд"""
+        return {
+            role: [t for timestamps in users.values() for t in timestamps]
+            for role, users in self.user_intervals().items()
+        }
+
+
+def iter_lessons(events, order='time', finished_limit=100000, wait_limit=24 * 3600):
+    """Группирует поток событий по урокам и выдаёт (lesson_id, LessonLog)
+
+    order='time' - журнал упорядочен по времени, как при дозаписи, а урок
+    записан одним интервалом lesson. Урок выдаётся, как только приходит его
+    конец: всё, что было до конца урока, уже прочитано, а более поздние
+    события на результат не влияют. В памяти держатся только идущие уроки
+    и входы, пришедшие раньше начала урока.
+    Запоздавшие события уже выданного урока пропускаются: для этого
+    запоминаются последние finished_limit выданных уроков. Урок, который
+    не начался за wait_limit секунд после своего первого события,
+    отбрасывается: присутствия на нём нет, а так отсекаются и входы,
+    пришедшие после конца более давних уроков.
+
+    order='lesson' - события каждого урока идут подряд. Урок выдаётся при
+    смене lesson_id, в памяти держится один урок.
+    """
+    if order == 'lesson':
+        current = None
+        for event in events:
+            if current is None or event.lesson_id != current.lesson_id:
+                if current is not None:
+                    yield current.lesson_id, current
+                current = LessonLog(event.lesson_id)
+            current.add(event)
+        if current is not None:
+            yield current.lesson_id, current
+        return
+
+    if order != 'time':
+        raise ValueError(f'Неизвестный порядок журнала: {order}')
+
+    active = {}
+    # Выданные уроки в порядке завершения; словарь - как упорядоченное множество
+    finished = {}
+    # Ещё не начавшиеся уроки -> время первого события. Журнал идёт по
+    # времени, поэтому самые давние всегда в начале словаря
+    waiting = {}
+    for event in events:
+        while waiting:
+            lesson_id, first_timestamp = next(iter(waiting.items()))
+            if event.timestamp - first_timestamp <= wait_limit:
+                break
+            del waiting[lesson_id]
+            del active[lesson_id]
+
+        lesson = active.get(event.lesson_id)
+        if lesson is None:
+            # Выход без входа ничего не меняет, а события выданного урока
+            # на его результат уже не влияют
+            if event.event == 'leave' or event.lesson_id in finished:
+                continue
+            lesson = active[event.lesson_id] = LessonLog(event.lesson_id)
+            waiting[event.lesson_id] = event.timestamp
+        lesson.add(event)
+        if lesson.started and event.lesson_id in waiting:
+            del waiting[event.lesson_id]
+        if lesson.finished:
+            del active[event.lesson_id]
+            finished[event.lesson_id] = None
+            if len(finished) > finished_limit:
+                del finished[next(iter(finished))]
+            yield lesson.lesson_id, lesson
+    for lesson_id, lesson in active.items():
+        if lesson.started:
+            yield lesson_id, lesson
+
+
+def iter_log_appearance(events, order='time'):
+    """Выдаёт (lesson_id, время общего присутствия) по мере завершения уроков"""
+    for lesson_id, lesson in iter_lessons(events, order):
+        yield lesson_id, appearance(lesson.to_intervals())
+
+
+def process_event_log(source, output, format=None, order='time'):
+    """Считает присутствие по журналу событий и пишет CSV lesson_id,seconds
+
+    source и output - пути к файлам. Результат каждого урока пишется
+    сразу после его завершения. Возвращает число обработанных уроков.
+    """
+    format = format or log_format(source)
+    lessons = 0
+    with open_log(source) as log, open(output, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(('lesson_id', 'seconds'))
+        for lesson_id, seconds in iter_log_appearance(iter_events(log, format), order):
+            writer.writerow((lesson_id, seconds))
+            lessons += 1
+    return lessons
+
+
+def open_records(path):
+    """Открывает файл записей уроков (.gz или обычный) в двоичном режиме"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def iter_file_chunks(path, chunk_bytes=1 << 20):
+    """Читает файл блоками около chunk_bytes байт, разрезая по границам строк
+
+    Каждая строка - запись одного урока, поэтому урок целиком попадает
+    в один блок.
+    """
+    with open_records(path) as file:
+        tail = b''
+        while True:
+            block = file.read(chunk_bytes)
+            if not block:
+                break
+            block = tail + block
+            cut = block.rfind(b'\n') + 1
+            tail = block[cut:]
+            if cut:
+                yield block[:cut]
+        if tail.strip():
+            yield tail
+
+
+def compute_appearance(lessons, engine='numpy'):
+    """Время присутствия для списка словарей уроков в виде array('q')"""
+    if engine == 'numpy':
+        return array('q', appearance_many(*pack_lessons(lessons)).tobytes())
+    if engine == 'python':
+        return array('q', map(appearance, lessons))
+    raise ValueError(f'Неизвестный способ вычисления: {engine}')
+
+
+def appearance_records_chunk(data, engine='numpy'):
+    """Обрабатывает блок строк JSONL вида {"lesson_id", "lesson", "pupil", "tutor"}
+
+    Выполняется в процессе-обработчике: получает сырые байты блока,
+    возвращает идентификаторы уроков и байты array('q') с результатами.
+    """
+    lesson_ids = []
+    lessons = []
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        lesson_ids.append(str(record['lesson_id']))
+        lessons.append(record)
+    return lesson_ids, compute_appearance(lessons, engine).tobytes()
+
+
+def encode_chunk(lesson, lesson_offsets, pupil, pupil_offsets, tutor, tutor_offsets, start, stop):
+    """Упаковывает уроки start:stop пачки в байты одного массива int64
+
+    Раскладка: число уроков n, три массива смещений по n + 1 элементу
+    (от начала своей роли), затем метки урока, ученика и учителя подряд.
+    """
+    import numpy as np
+
+    parts = [np.array([stop - start], dtype=np.int64)]
+    timestamps = []
+    for values, offsets in ((lesson, lesson_offsets), (pupil, pupil_offsets), (tutor, tutor_offsets)):
+        offsets = np.asarray(offsets[start:stop + 1], dtype=np.int64)
+        parts.append(offsets - offsets[0])
+        timestamps.append(np.asarray(values[offsets[0]:offsets[-1]], dtype=np.int64))
+    return np.concatenate(parts + timestamps).tobytes()
+
+
+def decode_chunk(data):
+    """Разбирает байты encode_chunk в шесть массивов для appearance_many без копирования"""
+    import numpy as np
+
+    values = np.frombuffer(data, dtype=np.int64)
+    count = int(values[0])
+    position = 1
+    offsets = []
+    for _ in range(3):
+        offsets.append(values[position:position + count + 1])
+        position += count + 1
+
+    arrays = []
+    for role_offsets in offsets:
+        size = int(role_offsets[-1])
+        arrays += [values[position:position + size], role_offsets]
+        position += size
+    return tuple(arrays)
+
+
+def appearance_packed_chunk(data, engine='numpy'):
+    """Обрабатывает пачку уроков из encode_chunk, возвращает байты array('q')"""
+    arrays = decode_chunk(data)
+    if engine == 'numpy':
+        return appearance_many(*arrays).tobytes()
+
+    lesson, lesson_offsets, pupil, pupil_offsets, tutor, tutor_offsets = (
+        array('q', values.tobytes()) for values in arrays
+    )
+    lessons = (
+        {
+            'lesson': lesson[lesson_offsets[i]:lesson_offsets[i + 1]],
+            'pupil': pupil[pupil_offsets[i]:pupil_offsets[i + 1]],
+            'tutor': tutor[tutor_offsets[i]:tutor_offsets[i + 1]],
+        }
+        for i in range(len(lesson_offsets) - 1)
+    )
+    return compute_appearance(lessons, engine).tobytes()
+
+
+def ordered_map(func, chunks, workers=None, engine='numpy'):
+    """Применяет func(chunk, engine) к блокам в пуле процессов, сохраняя порядок
+
+    Одновременно в работе не больше двух блоков на процесс, так что входной
+    поток читается по мере обработки. При workers=1 всё считается в текущем
+    процессе.
+    """
+    if workers == 1:
+        for chunk in chunks:
+            yield func(chunk, engine)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        max_pending = 2 * workers
+        for chunk in chunks:
+            pending.append(executor.submit(func, chunk, engine))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def appearance_file_parallel(path, workers=None, chunk_bytes=1 << 20, engine='numpy'):
+    """Выдаёт (lesson_id, время присутствия) для файла записей уроков JSONL
+
+    Файл режется на блоки по границам строк, блоки считаются в пуле
+    процессов, результаты выдаются в порядке записей.
+    """
+    results = ordered_map(
+        appearance_records_chunk, iter_file_chunks(path, chunk_bytes), workers, engine
+    )
+    for lesson_ids, data in results:
+        yield from zip(lesson_ids, array('q', data))
+
+
+def appearance_many_parallel(lesson, lesson_offsets, pupil, pupil_offsets, tutor, tutor_offsets,
+                             workers=None, chunk_size=50000, engine='numpy'):
+    """То же, что appearance_many, но пачка режется по урокам и считается в пуле процессов"""
+    import numpy as np
+
+    arrays = (lesson, lesson_offsets, pupil, pupil_offsets, tutor, tutor_offsets)
+    count = len(lesson_offsets) - 1
+    chunks = (
+        encode_chunk(*arrays, start, min(start + chunk_size, count))
+        for start in range(0, count, chunk_size)
+    )
+    results = array('q')
+    for data in ordered_map(appearance_packed_chunk, chunks, workers, engine):
+        results.frombytes(data)
+    return np.frombuffer(results, dtype=np.int64)
+
+
+def main(argv=None):
+    """Точка входа командной строки
+
+    Без аргументов печатает пример из условия. С файлом записей уроков
+    JSONL (по одной {"lesson_id", "lesson", "pupil", "tutor"} на строку)
+    пишет CSV lesson_id,seconds и сообщает скорость в уроках в секунду.
+    """
+    parser = argparse.ArgumentParser(description='Время общего присутствия ученика и учителя на уроках')
+    parser.add_argument('input', nargs='?', help='файл записей уроков .jsonl или .jsonl.gz')
+    parser.add_argument('--output', help='CSV с результатами (по умолчанию stdout)')
+    parser.add_argument('--workers', type=int, default=None, help='число процессов (по умолчанию - по числу ядер)')
+    parser.add_argument('--chunk-bytes', type=int, default=1 << 20)
+    parser.add_argument('--engine', choices=('numpy', 'python'), default='numpy')
+    args = parser.parse_args(argv)
+
+    if args.input is None:
+        # Тестовый пример
+        test_data = {
+            'lesson': [1594663200, 1594666800],  # урок с 12:00 до 13:00
+            'pupil': [1594663340, 1594663389, 1594663390, 1594663395, 1594663396, 1594666472],
+            'tutor': [1594663290, 1594663430, 1594663443, 1594666473]
+        }
+
+        result = appearance(test_data)
+        print(f"Общее время присутствия: {result} секунд")
+        return 0
+
+    output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    lessons = 0
+    started = time.perf_counter()
+    try:
+        writer = csv.writer(output)
+        writer.writerow(('lesson_id', 'seconds'))
+        for lesson_id, seconds in appearance_file_parallel(
+            args.input, args.workers, args.chunk_bytes, args.engine
+        ):
+            writer.writerow((lesson_id, seconds))
+            lessons += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    rate = lessons / elapsed if elapsed else 0.0
+    print(f"Уроков: {lessons}, время: {elapsed:.2f} с, скорость: {rate:.0f} уроков/с", file=sys.stderr)
+    return 0
+
+
 if __name__ == "__main__":
-    # Тестовый пример
-    test_data = {
-        'lesson': [1594663200, 1594666800],  # урок с 12:00 до 13:00
-        'pupil': [1594663340, 1594663389, 1594663390, 1594663395, 1594663396, 1594666472],  
-        'tutor': [1594663290, 1594663430, 1594663443, 1594666473]
-    }
-    
-    result = appearance(test_data)
-    print(f"Общее время присутствия: {result} секунд")
\ No newline at end of file
+    sys.exit(main())
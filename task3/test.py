@@ -1,4 +1,53 @@
-from solution import appearance
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import weakref
+
+import solution
+from solution import (
+    appearance, appearance_at_least, appearance_file_parallel, appearance_many,
+    appearance_many_parallel, group_presence, iter_events, iter_lessons, iter_log_appearance,
+    pack_lessons, process_event_log, pupil_overlaps
+)
+
+
+def present_at(timestamps, moment):
+    """Присутствует ли участник в секунду moment (проверка перебором)"""
+    return any(start <= moment < end for start, end in zip(timestamps[0::2], timestamps[1::2]))
+
+
+def intervals_to_events(lesson_id, intervals):
+    """Превращает словарь интервалов урока в записи журнала (ученик и учитель - по одному участнику)"""
+    events = []
+    users = {'lesson': '', 'pupil': 'p1', 'tutor': 't1'}
+    for role, user_id in users.items():
+        timestamps = intervals[role]
+        for i in range(0, len(timestamps), 2):
+            events.append([lesson_id, user_id, role, 'enter', timestamps[i]])
+            events.append([lesson_id, user_id, role, 'leave', timestamps[i + 1]])
+    return events
+
+
+def time_order(events):
+    """Порядок дозаписи: по времени, при равном времени входы раньше выходов"""
+    return sorted(events, key=lambda event: (event[4], event[3] == 'leave'))
+
+
+def to_csv(events):
+    """Текст журнала в CSV с заголовком"""
+    lines = ['lesson_id,user_id,role,event,timestamp']
+    lines += [','.join(str(field) for field in event) for event in events]
+    return '\n'.join(lines) + '\n'
+
+
+def to_jsonl(events):
+    """Текст журнала в JSONL"""
+    keys = ('lesson_id', 'user_id', 'role', 'event', 'timestamp')
+    return ''.join(json.dumps(dict(zip(keys, event))) + '\n' for event in events)
 
 
 def run_tests():
@@ -6,6 +55,7 @@ def run_tests():
     
     def test_case(name, intervals, expected_result):
         """Выполняет один тест"""
+        cases.append((intervals, expected_result))
         result = appearance(intervals)
         status = "PASS" if result == expected_result else "FAIL"
         print(f"{status}: {name}")
@@ -22,6 +72,8 @@ def run_tests():
     
     passed = 0
     total = 0
+    # Все проверенные словари, они же прогоняются пачкой через appearance_many
+    cases = []
     
     # Тест 1: Базовый случай - полное пересечение
     total += 1
@@ -152,7 +204,382 @@ def run_tests():
         15  # пересечения: (15-20)+(35-40)+(55-60) = 5+5+5 = 15
     ):
         passed += 1
-    
+
+    # Тест 11: Пересекающиеся заходы ученика (второй пример из task3.md)
+    total += 1
+    if test_case(
+        "Тест 11: Пересекающиеся заходы ученика",
+        {
+            'lesson': [1594702800, 1594706400],
+            'pupil': [1594702789, 1594704500, 1594702807, 1594704542, 1594704512, 1594704513, 1594704564, 1594705150, 1594704581, 1594704582, 1594704734, 1594705009, 1594705095, 1594705096, 1594705106, 1594706480, 1594705158, 1594705773, 1594705849, 1594706480, 1594706500, 1594706875, 1594706502, 1594706503, 1594706524, 1594706524, 1594706579, 1594706641],
+            'tutor': [1594700035, 1594700364, 1594702749, 1594705148, 1594705149, 1594706463]
+        },
+        3577  # перекрывающиеся заходы учитываются один раз
+    ):
+        passed += 1
+
+    # Тест 12: Присутствие за границами урока (третий пример из task3.md)
+    total += 1
+    if test_case(
+        "Тест 12: Присутствие за границами урока",
+        {
+            'lesson': [1594692000, 1594695600],
+            'pupil': [1594692033, 1594696347],
+            'tutor': [1594692017, 1594692066, 1594692068, 1594696341]
+        },
+        3565
+    ):
+        passed += 1
+
+    # Тест 13: Вложенные и неотсортированные интервалы
+    total += 1
+    if test_case(
+        "Тест 13: Вложенные и неотсортированные интервалы",
+        {
+            'lesson': [0, 100],
+            'pupil': [50, 60, 10, 40, 20, 30, 35, 55],  # склеиваются в (10-60)
+            'tutor': [0, 20, 25, 100, 5, 15]            # склеиваются в (0-20), (25-100)
+        },
+        45  # (10-20) + (25-60) = 10 + 35 = 45
+    ):
+        passed += 1
+
+    # Тест 14: Тысячи переподключений
+    total += 1
+    reconnects = 20000
+    pupil = []
+    tutor = []
+    for i in range(reconnects):
+        pupil += [i * 10, i * 10 + 6]      # по 6 секунд каждые 10 секунд
+        tutor += [i * 10 + 3, i * 10 + 14]  # по 11 секунд, заходы перекрываются
+    start = time.perf_counter()
+    ok = test_case(
+        "Тест 14: Тысячи переподключений",
+        {
+            'lesson': [0, reconnects * 10],
+            'pupil': pupil,
+            'tutor': tutor
+        },
+        (reconnects - 1) * 6 + 3  # учитель присутствует всё время с 3-й секунды
+    )
+    elapsed = time.perf_counter() - start
+    print(f"  Время: {elapsed * 1000:.1f} мс")
+    print()
+    if ok and elapsed < 1:
+        passed += 1
+
+    # Тест 15: Пачка уроков через appearance_many
+    total += 1
+    random.seed(15)
+
+    def random_timestamps(count):
+        timestamps = []
+        for _ in range(count):
+            start = random.randint(0, 200)
+            timestamps += [start, start + random.randint(-5, 60)]
+        return timestamps
+
+    lessons = [intervals for intervals, _ in cases]
+    expected = [answer for _, answer in cases]
+    for _ in range(2000):
+        intervals = {
+            'lesson': random_timestamps(random.randint(0, 2)),
+            'pupil': random_timestamps(random.randint(0, 8)),
+            'tutor': random_timestamps(random.randint(0, 8))
+        }
+        lessons.append(intervals)
+        expected.append(appearance(intervals))
+    result = appearance_many(*pack_lessons(lessons))
+    mismatches = [i for i, answer in enumerate(expected) if result[i] != answer]
+    status = "PASS" if not mismatches and result.dtype == 'int64' else "FAIL"
+    print(f"{status}: Тест 15: Пачка из {len(lessons)} уроков через appearance_many")
+    if mismatches:
+        print(f"  ОШИБКА: не совпадают уроки {mismatches[:10]}")
+    print()
+    if status == "PASS":
+        passed += 1
+
+    def check(name, result, expected_result):
+        """Выполняет проверку результата, вычисленного вне test_case"""
+        status = "PASS" if result == expected_result else "FAIL"
+        print(f"{status}: {name}")
+        if result != expected_result:
+            print(f"  Ожидаемый результат: {expected_result}")
+            print(f"  Полученный результат: {result}")
+            print(f"  ОШИБКА: результаты не совпадают!")
+        print()
+        return result == expected_result
+
+    # Журнал событий: те же уроки, что выше, с одним интервалом урока
+    # и корректными интервалами участников
+    log_lessons = {
+        f'L{i}': intervals for i, (intervals, _) in enumerate(cases)
+        if len(intervals['lesson']) == 2
+        and all(start < end for role in intervals
+               for start, end in zip(intervals[role][0::2], intervals[role][1::2]))
+    }
+    log_expected = {lesson_id: appearance(intervals) for lesson_id, intervals in log_lessons.items()}
+    log_events = []
+    for lesson_id, intervals in log_lessons.items():
+        log_events += intervals_to_events(lesson_id, intervals)
+
+    # Тест 16: Журнал CSV в порядке дозаписи
+    total += 1
+    events = iter_events(io.StringIO(to_csv(time_order(log_events))), 'csv')
+    if check(
+        "Тест 16: Журнал CSV в порядке дозаписи",
+        sorted(iter_log_appearance(events)),
+        sorted(log_expected.items())
+    ):
+        passed += 1
+
+    # Тест 17: Журнал JSONL, сгруппированный по урокам
+    total += 1
+    events = iter_events(io.StringIO(to_jsonl(log_events)), 'jsonl')
+    if check(
+        "Тест 17: Журнал JSONL, сгруппированный по урокам",
+        list(iter_log_appearance(events, order='lesson')),
+        list(log_expected.items())
+    ):
+        passed += 1
+
+    # Тест 18: Незакрытые подключения и вход с двух вкладок
+    total += 1
+    events = [
+        ['A', '', 'lesson', 'enter', 0],
+        ['A', 't1', 'tutor', 'enter', 0],
+        ['A', 'p1', 'pupil', 'enter', 10],   # выход не записан
+        ['A', 't1', 'tutor', 'enter', 20],   # вторая вкладка
+        ['A', 't1', 'tutor', 'leave', 30],   # учитель ещё во второй вкладке
+        ['A', 't1', 'tutor', 'leave', 60],
+        ['A', 'p2', 'pupil', 'leave', 70],   # выход без входа пропускается
+        ['A', '', 'lesson', 'leave', 100],
+        ['A', 't1', 'tutor', 'enter', 110],  # после конца урока
+        ['B', '', 'lesson', 'enter', 0],     # конец урока не записан
+        ['B', 'p1', 'pupil', 'enter', 5],
+        ['B', 't1', 'tutor', 'enter', 15],
+    ]
+    events = iter_events(io.StringIO(to_csv(events)), 'csv')
+    if check(
+        "Тест 18: Незакрытые подключения и вход с двух вкладок",
+        list(iter_log_appearance(events)),
+        [('A', 50), ('B', 0)]  # A: (10-60); B: конец урока - последнее событие, 15
+    ):
+        passed += 1
+
+    # Тест 19: Урок выдаётся до чтения остального журнала
+    total += 1
+    consumed = []
+
+    def tracked(events):
+        for event in events:
+            consumed.append(event)
+            yield event
+
+    events = iter_events(io.StringIO(to_csv(time_order(log_events))), 'csv')
+    lesson_id, _ = next(iter_lessons(tracked(events)))
+    if check(
+        "Тест 19: Урок выдаётся до чтения остального журнала",
+        (lesson_id in log_expected, len(consumed) < len(log_events)),
+        (True, True)
+    ):
+        passed += 1
+
+    # Тест 20: Файлы .csv.gz на диске
+    total += 1
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'events.csv.gz')
+        with gzip.open(source, 'wt', encoding='utf-8') as file:
+            file.write(to_csv(time_order(log_events)))
+        output = os.path.join(directory, 'result.csv')
+        count = process_event_log(source, output)
+        with open(output, encoding='utf-8') as file:
+            lines = file.read().splitlines()
+    written = dict(line.split(',') for line in lines[1:])
+    if check(
+        "Тест 20: Файлы .csv.gz на диске",
+        (count, lines[0], {key: int(value) for key, value in written.items()}),
+        (len(log_expected), 'lesson_id,seconds', log_expected)
+    ):
+        passed += 1
+
+    # Тест 21: Файл записей уроков в пуле процессов
+    total += 1
+    lessons = [intervals for intervals, _ in cases]
+    expected = [appearance(intervals) for intervals in lessons]
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'lessons.jsonl.gz')
+        with gzip.open(source, 'wt', encoding='utf-8') as file:
+            for i, intervals in enumerate(lessons):
+                file.write(json.dumps(dict(intervals, lesson_id=i)) + '\n')
+        results = {
+            engine: list(appearance_file_parallel(source, workers=2, chunk_bytes=4096, engine=engine))
+            for engine in ('numpy', 'python')
+        }
+    ordered = [(str(i), answer) for i, answer in enumerate(expected)]
+    if check(
+        "Тест 21: Файл записей уроков в пуле процессов",
+        results,
+        {'numpy': ordered, 'python': ordered}
+    ):
+        passed += 1
+
+    # Тест 22: Пачка уроков, разрезанная между процессами
+    total += 1
+    packed = pack_lessons(lessons)
+    results = {
+        engine: appearance_many_parallel(*packed, workers=2, chunk_size=300, engine=engine).tolist()
+        for engine in ('numpy', 'python')
+    }
+    if check(
+        "Тест 22: Пачка уроков, разрезанная между процессами",
+        results,
+        {'numpy': expected, 'python': expected}
+    ):
+        passed += 1
+
+    # Тест 23: Групповой урок с одним учеником совпадает с appearance
+    total += 1
+    results = []
+    for intervals in lessons:
+        group = {'lesson': intervals['lesson'], 'tutor': intervals['tutor'], 'pupils': [intervals['pupil']]}
+        results.append((appearance_at_least(group, 1), pupil_overlaps(group)[0]))
+    if check(
+        "Тест 23: Групповой урок с одним учеником",
+        results,
+        [(answer, answer) for answer in expected]
+    ):
+        passed += 1
+
+    # Тест 24: Учитель и не меньше k из 30 учеников, проверка перебором по секундам
+    total += 1
+    random.seed(24)
+    results = []
+    brute_force = []
+    for _ in range(30):
+        group = {
+            'lesson': random_timestamps(1),
+            'tutor': random_timestamps(random.randint(1, 4)),
+            'pupils': {f'p{i}': random_timestamps(random.randint(0, 5)) for i in range(30)}
+        }
+        at_least = [0] * 31
+        overlap = dict.fromkeys(group['pupils'], 0)
+        for moment in range(-10, 300):
+            if present_at(group['lesson'], moment) and present_at(group['tutor'], moment):
+                here = [pupil for pupil, timestamps in group['pupils'].items() if present_at(timestamps, moment)]
+                for k in range(len(here) + 1):
+                    at_least[k] += 1
+                for pupil in here:
+                    overlap[pupil] += 1
+        brute_force.append((at_least, overlap))
+        results.append(tuple(group_presence(group)))
+    if check(
+        "Тест 24: Учитель и не меньше k из 30 учеников",
+        results,
+        brute_force
+    ):
+        passed += 1
+
+    # Тест 25: Групповой урок из журнала событий
+    total += 1
+    events = [
+        ['G', '', 'lesson', 'enter', 0],
+        ['G', 't1', 'tutor', 'enter', 10],
+        ['G', 'p1', 'pupil', 'enter', 0],
+        ['G', 'p2', 'pupil', 'enter', 20],
+        ['G', 'p1', 'pupil', 'leave', 50],
+        ['G', 'p3', 'pupil', 'enter', 60],
+        ['G', 't1', 'tutor', 'leave', 90],
+        ['G', '', 'lesson', 'leave', 100],
+    ]
+    _, log = next(iter_lessons(iter_events(io.StringIO(to_csv(time_order(events))), 'csv')))
+    if check(
+        "Тест 25: Групповой урок из журнала событий",
+        tuple(group_presence(log.to_group_intervals())),
+        ([80, 80, 60, 0], {'p1': 40, 'p2': 70, 'p3': 30})
+    ):
+        passed += 1
+
+    # Тест 26: 30 учеников по тысяче переподключений
+    total += 1
+    group = {'lesson': [0, 100000], 'tutor': [0, 100000], 'pupils': {}}
+    for i in range(30):
+        timestamps = []
+        for j in range(1000):
+            timestamps += [j * 100 + i, j * 100 + i + 50]
+        group['pupils'][f'p{i}'] = timestamps
+    start = time.perf_counter()
+    result = group_presence(group)
+    elapsed = time.perf_counter() - start
+    ok = check(
+        "Тест 26: 30 учеников по тысяче переподключений",
+        (result.at_least[30], result.at_least[1], set(result.overlap.values())),
+        (21 * 1000, 79 * 1000, {50 * 1000})  # сдвиг i: все 30 на месте 21 с из 100, хотя бы один - 79 с
+    )
+    print(f"  Время: {elapsed * 1000:.1f} мс")
+    print()
+    if ok and elapsed < 1:
+        passed += 1
+
+    # Тест 27: Запоздавшие входы после конца урока не копятся в памяти
+    total += 1
+    events = []
+    for i in range(1000):
+        start = i * 10
+        events += intervals_to_events(
+            i, {'lesson': [start, start + 5], 'pupil': [start, start + 5], 'tutor': [start + 1, start + 5]}
+        )
+        events.append([i, 'p1', 'pupil', 'enter', start + 7])  # вернулся после конца урока
+    created = []
+
+    class CountedLessonLog(solution.LessonLog):
+        def __init__(self, lesson_id):
+            super().__init__(lesson_id)
+            created.append(lesson_id)
+
+    original, solution.LessonLog = solution.LessonLog, CountedLessonLog
+    try:
+        results = list(iter_log_appearance(iter_events(io.StringIO(to_csv(time_order(events))), 'csv')))
+    finally:
+        solution.LessonLog = original
+    if check(
+        "Тест 27: Запоздавшие входы после конца урока не копятся в памяти",
+        (len(results), set(answer for _, answer in results), len(created)),
+        (1000, {4}, 1000)
+    ):
+        passed += 1
+
+    # Тест 28: Уроки без начала не держатся в памяти до конца журнала
+    total += 1
+    events = []
+    for i in range(1000):
+        # Ученик зашёл, а урок так и не начался
+        events.append([f'orphan{i}', 'p1', 'pupil', 'enter', i * 10])
+    events += intervals_to_events('last', {'lesson': [10000, 10050], 'pupil': [10000, 10050],
+                                           'tutor': [10010, 10050]})
+    alive = weakref.WeakSet()
+
+    class TrackedLessonLog(solution.LessonLog):
+        def __init__(self, lesson_id):
+            super().__init__(lesson_id)
+            alive.add(self)
+
+    original, solution.LessonLog = solution.LessonLog, TrackedLessonLog
+    try:
+        events = iter_events(io.StringIO(to_csv(time_order(events))), 'csv')
+        lessons = iter_lessons(events, wait_limit=100)
+        lesson_id, log = next(lessons)
+        waiting = len(alive) - 1  # без выданного урока, пока журнал ещё читается
+        lessons.close()
+    finally:
+        solution.LessonLog = original
+    if check(
+        "Тест 28: Уроки без начала не держатся в памяти до конца журнала",
+        (lesson_id, appearance(log.to_intervals()), waiting <= 11),
+        ('last', 40, True)
+    ):
+        passed += 1
+
     print("=" * 60)
     print(f"РЕЗУЛЬТАТЫ ТЕСТИРОВАНИЯ")
     print("=" * 60)